@@ -46,5 +46,9 @@ class ODDSDataset(Dataset):
 
         return sample, target, semi_target, index
 
+    def tensors(self):
+        """the (sample, target, semi_target, index) tensors of the whole set, in the same form as the batches of __getitem__"""
+        return self.data, self.targets, self.semi_targets, torch.arange(len(self.data))
+
     def __len__(self):
         return len(self.data)
@@ -32,6 +32,8 @@ from datasets.main import load_dataset
 @click.option('--seed', type=int, default=-1, help='Set seed. If -1, use randomization.')
 @click.option('--kernel', type=click.Choice(['rbf']), default='rbf', help='Kernel for SSAD')
 @click.option('--kappa', type=float, default=1.0, help='SSAD hyperparameter kappa.')
+@click.option('--solver', type=click.Choice(['cvxopt', 'smo']), default='cvxopt',
+              help='Dual solver of SSAD: dense QP (cvxopt) or SMO-style decomposition for large datasets (smo).')
 @click.option('--hybrid', type=bool, default=False,
               help='Train SSAD on features extracted from an autoencoder. If True, load_ae must be specified')
 @click.option('--load_ae', type=click.Path(exists=True), default=None,
@@ -48,7 +50,7 @@ from datasets.main import load_dataset
                    'If 1, outlier class as specified in --known_outlier_class option.'
                    'If > 1, the specified number of outlier classes will be sampled at random.')
 def main(dataset_name, xp_path, data_path, load_config, load_model, ratio_known_normal, ratio_known_outlier,
-         ratio_pollution, seed, kernel, kappa, hybrid, load_ae, n_jobs_dataloader, normal_class, known_outlier_class,
+         ratio_pollution, seed, kernel, kappa, solver, hybrid, load_ae, n_jobs_dataloader, normal_class, known_outlier_class,
          n_known_outlier_classes):
     """
     (Hybrid) SSAD for anomaly detection as in Goernitz et al., Towards Supervised Anomaly Detection, JAIR, 2013.
@@ -96,6 +98,7 @@ def main(dataset_name, xp_path, data_path, load_config, load_model, ratio_known_
     # Print SSAD configuration
     logger.info('SSAD kernel: %s' % cfg.settings['kernel'])
     logger.info('Kappa-paramerter: %.2f' % cfg.settings['kappa'])
+    logger.info('Solver: %s' % cfg.settings['solver'])
     logger.info('Hybrid model: %s' % cfg.settings['hybrid'])
 
     # Set seed
@@ -123,7 +126,8 @@ def main(dataset_name, xp_path, data_path, load_config, load_model, ratio_known_
         logger.info('Known anomaly classes: %s' % (dataset.known_outlier_classes,))
 
     # Initialize SSAD model
-    ssad = SSAD(kernel=cfg.settings['kernel'], kappa=cfg.settings['kappa'], hybrid=cfg.settings['hybrid'])
+    ssad = SSAD(kernel=cfg.settings['kernel'], kappa=cfg.settings['kappa'], hybrid=cfg.settings['hybrid'],
+                solver=cfg.settings['solver'])
 
     # If specified, load model parameters from already trained model
     if load_model:
@@ -4,3 +4,4 @@ from .kde import KDE
 from .isoforest import IsoForest
 from .ssad import SSAD
 from .shallow_ssad.ssad_convex import ConvexSSAD
+from .shallow_ssad.ssad_smo import SMOSSAD
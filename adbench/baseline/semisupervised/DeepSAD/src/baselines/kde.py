@@ -8,8 +8,10 @@ from torch.utils.data import DataLoader
 from sklearn.neighbors import KernelDensity
 from sklearn.metrics import roc_auc_score
 from sklearn.metrics.pairwise import pairwise_distances
-from sklearn.model_selection import GridSearchCV
+from sklearn.model_selection import GridSearchCV, KFold
+from joblib import Parallel, delayed
 from base.base_dataset import BaseADDataset
+from .kernels import RBFKernelSweep
 from networks.main import build_autoencoder
 
 
@@ -35,9 +37,76 @@ class KDE(object):
             'test_scores': None
         }
 
+    def cv_log_likelihood(self, X, bandwidths, cv=5, working_memory=1024):
+        """
+        Mean held-out log-likelihood of each bandwidth over the folds, the same as the mean_test_score of
+        GridSearchCV(KernelDensity(kernel='gaussian'), {'bandwidth': bandwidths}, cv=cv).
+        The squared distances between the held-out and the training part of each fold are computed once
+        (in row blocks) and shared by all the bandwidths, instead of building and querying a tree per fit.
+        The folds are computed in parallel (threads) with self.n_jobs.
+        """
+        X = np.asarray(X, dtype=np.float64)
+        bandwidths = np.asarray(bandwidths, dtype=np.float64)
+        scores = Parallel(n_jobs=self.n_jobs, prefer='threads')(
+            delayed(self.fold_log_likelihood)(X[train_idx], X[test_idx], bandwidths, working_memory)
+            for train_idx, test_idx in KFold(n_splits=cv).split(X))
+
+        return np.mean(scores, axis=0)
+
+    @staticmethod
+    def fold_log_likelihood(X_train, X_test, bandwidths, working_memory=1024):
+        """
+        Total log-likelihood of X_test under the gaussian kernel density of X_train, for each bandwidth.
+        With a = 1 / (2 h^2) and the per-row minimum d_min of the squared distances,
+            log sum_j exp(-a d_ij) = -a d_min + log sum_j exp(-a (d_ij - d_min)),
+        where the shifted sum is >= 1 (no underflow to log(0)). The bandwidths are visited in the descending order,
+        and if a is 2^m times the previous a (e.g., the logspace grid of base 2 with the step 0.5 has m = 1),
+        the shifted kernel is the previous one squared m times, so that exp is only evaluated once per block.
+        """
+        n, d = X_train.shape
+        order = np.argsort(-bandwidths)
+        a = 0.5 / bandwidths[order] ** 2
+        squarings = np.zeros(len(a), dtype=int)  # 0 means evaluating exp
+        squarings[1:] = np.rint(np.log2(a[1:] / a[:-1]))
+        squarings[1:][~np.isclose(a[1:], a[:-1] * 2.0 ** squarings[1:], rtol=1e-12, atol=0) | (squarings[1:] > 4)] = 0
+
+        sweep = RBFKernelSweep(dtype=np.float64, working_memory=working_memory)
+        log_sum = np.zeros(len(a))
+        sum_d_min = 0.0
+        step = sweep.block_rows(n)
+        for start in range(0, X_test.shape[0], step):
+            D = sweep.sqdist(X_test[start:start + step], X_train)
+            d_min = D.min(axis=1)
+            D -= d_min[:, np.newaxis]
+            sum_d_min += np.sum(d_min)
+            K = np.empty_like(D)
+            for b in range(len(a)):
+                if squarings[b] == 0:
+                    np.multiply(D, -a[b], out=K)
+                    np.exp(K, out=K)
+                else:
+                    for _ in range(squarings[b]):
+                        np.square(K, out=K)
+                log_sum[b] += np.sum(np.log(K.sum(axis=1)))
+
+        # log of the normalized gaussian kernel density, see KernelDensity.score_samples
+        scores = np.empty(len(a))
+        scores[order] = log_sum - a * sum_d_min - X_test.shape[0] * (np.log(n) + 0.5 * d * np.log(np.pi / a))
+
+        return scores
+
     def train(self, dataset: BaseADDataset, device: str = 'cpu', n_jobs_dataloader: int = 0,
-              bandwidth_GridSearchCV: bool = True):
-        """Trains the Kernel Density Estimation model on the training data."""
+              bandwidth_GridSearchCV: bool = True, fast_bandwidth_search: bool = True):
+        """
+        Trains the Kernel Density Estimation model on the training data.
+
+        With fast_bandwidth_search (gaussian kernel only), the bandwidth is selected by cv_log_likelihood, i.e.,
+        the exact held-out log-likelihood (the same as logsumexp over the dense distances), instead of GridSearchCV.
+        The folds are the same, but the scores of GridSearchCV come from the tree-based KernelDensity.score,
+        which is inaccurate when the held-out densities are tiny (small bandwidths relative to the distances,
+        e.g., in high dimensions): there it can over-estimate the log-likelihood by a large margin,
+        so the selected bandwidth can differ from GridSearchCV. The other kernels always use GridSearchCV.
+        """
         logger = logging.getLogger()
 
         # do not drop last batch for non-SGD optimization shallow_ssad
@@ -59,7 +128,15 @@ class KDE(object):
         logger.info('Starting training...')
         start_time = time.time()
 
-        if bandwidth_GridSearchCV:
+        if bandwidth_GridSearchCV and fast_bandwidth_search and self.kernel == 'gaussian':
+            # the same cross-validation as GridSearchCV, with the distances of each fold computed once
+            logger.info('Using the cross-validated log-likelihood for bandwidth selection...')
+            bandwidths = np.logspace(0.5, 5, num=10, base=2)
+            cv_scores = self.cv_log_likelihood(X, bandwidths, cv=5)
+            self.bandwidth = bandwidths[np.argmax(cv_scores)]
+            logger.info('Best bandwidth: {:.8f}'.format(self.bandwidth))
+            self.model = KernelDensity(kernel=self.kernel, bandwidth=self.bandwidth).fit(X)
+        elif bandwidth_GridSearchCV:
             # use grid search cross-validation to select bandwidth
             logger.info('Using GridSearchCV for bandwidth selection...')
             params = {'bandwidth': np.logspace(0.5, 5, num=10, base=2)}
@@ -0,0 +1,56 @@
+import numpy as np
+
+from sklearn.metrics.pairwise import euclidean_distances
+
+
+class RBFKernelSweep(object):
+    """
+    RBF kernels of several gammas from the same squared Euclidean distances.
+
+    The squared distances do not depend on gamma, so they are computed only once (in row blocks)
+    and the kernel of each gamma is derived by k = exp(-gamma * d) in place, block by block.
+    With dtype=np.float64 the kernels are the same as sklearn pairwise_kernels(X, Y, metric='rbf', gamma=gamma)
+    (up to the floating-point rounding of the blocked matrix product).
+    """
+
+    def __init__(self, dtype=np.float64, working_memory: int = 1024):
+        """
+        :param dtype: np.float64 or np.float32 (half of the memory) of the distances and kernels
+        :param working_memory: maximum memory (MB) of the temporary block in the distance computation
+        """
+        self.dtype = dtype
+        self.working_memory = working_memory
+
+    def block_rows(self, n_cols):
+        # number of rows of a block, so that the temporaries of one block fit in the working memory
+        return max(int(self.working_memory * 2 ** 20 // (max(n_cols, 1) * 8 * 2)), 1)
+
+    def sqdist(self, X, Y=None):
+        """Squared Euclidean distances between the rows of X and Y (Y=None means X)."""
+        symmetric = Y is None
+        X = np.asarray(X, dtype=self.dtype)
+        Y = X if symmetric else np.asarray(Y, dtype=self.dtype)
+
+        D = np.empty((X.shape[0], Y.shape[0]), dtype=self.dtype)
+        YY = np.einsum('ij,ij->i', Y, Y, dtype=np.float64)[np.newaxis, :]
+        step = self.block_rows(Y.shape[0])
+        for start in range(0, X.shape[0], step):
+            end = min(start + step, X.shape[0])
+            D[start:end] = euclidean_distances(X[start:end], Y, Y_norm_squared=YY, squared=True)
+            if symmetric:
+                # the distance of a sample to itself is exactly 0 (the same as euclidean_distances(X, X))
+                np.fill_diagonal(D[start:end, start:end], 0)
+
+        return D
+
+    def kernel(self, D, gamma, out=None):
+        """RBF kernel exp(-gamma * D), out can be a buffer reused over the gammas (or D itself)."""
+        if out is None:
+            out = np.empty_like(D)
+        step = self.block_rows(D.shape[1])
+        for start in range(0, D.shape[0], step):
+            block = out[start:start + step]
+            np.multiply(D[start:start + step], -gamma, out=block)
+            np.exp(block, out=block)
+
+        return out
@@ -8,19 +8,24 @@ from torch.utils.data import DataLoader
 from sklearn.svm import OneClassSVM
 from sklearn.metrics import roc_auc_score
 from base.base_dataset import BaseADDataset
+from .kernels import RBFKernelSweep
 from networks.main import build_autoencoder
 
 
 class OCSVM(object):
     """A class for One-Class SVM models."""
 
-    def __init__(self, kernel='rbf', nu=0.1, hybrid=False):
+    def __init__(self, kernel='rbf', nu=0.1, hybrid=False, kernel_dtype=np.float64, working_memory=1024):
         """Init OCSVM instance."""
         self.kernel = kernel
         self.nu = nu
         self.rho = None
         self.gamma = None
 
+        # the rbf kernels of the gamma sweep are derived from the squared distances computed once (precomputed kernel)
+        self.rbf_sweep = RBFKernelSweep(dtype=kernel_dtype, working_memory=working_memory) if kernel == 'rbf' else None
+        self.X_train = None  # training data for the precomputed test kernel
+
         self.model = OneClassSVM(kernel=kernel, nu=nu)
 
         self.hybrid = hybrid
@@ -85,19 +90,34 @@ class OCSVM(object):
                                 X_test[perm][labels[perm] == 1][:n_val_outlier]))
         labels = np.array([0] * n_val_normal + [1] * n_val_outlier)
 
+        # Squared distances of the training and validation kernels (the same for all gammas)
+        if self.rbf_sweep is not None:
+            D, D_val = self.rbf_sweep.sqdist(X), self.rbf_sweep.sqdist(X_val, X)
+            kernel, kernel_val = np.empty_like(D), np.empty_like(D_val)
+            self.X_train = X
+
         i = 1
         for gamma in gammas:
 
             # Model candidate
-            model = OneClassSVM(kernel=self.kernel, nu=self.nu, gamma=gamma)
+            if self.rbf_sweep is not None:
+                model = OneClassSVM(kernel='precomputed', nu=self.nu)
+            else:
+                model = OneClassSVM(kernel=self.kernel, nu=self.nu, gamma=gamma)
 
             # Train
             start_time = time.time()
-            model.fit(X)
+            if self.rbf_sweep is not None:
+                model.fit(self.rbf_sweep.kernel(D, gamma, out=kernel))
+            else:
+                model.fit(X)
             train_time = time.time() - start_time
 
             # Test on small hold-out set from test set
-            scores = (-1.0) * model.decision_function(X_val)
+            if self.rbf_sweep is not None:
+                scores = (-1.0) * model.decision_function(self.rbf_sweep.kernel(D_val, gamma, out=kernel_val))
+            else:
+                scores = (-1.0) * model.decision_function(X_val)
             scores = scores.flatten()
 
             # Compute AUC
@@ -152,7 +172,11 @@ class OCSVM(object):
         logger.info('Starting testing...')
         start_time = time.time()
 
-        scores = (-1.0) * self.model.decision_function(X)
+        if self.rbf_sweep is not None:
+            kernel = self.rbf_sweep.kernel(self.rbf_sweep.sqdist(X, self.X_train), self.gamma)
+            scores = (-1.0) * self.model.decision_function(kernel)
+        else:
+            scores = (-1.0) * self.model.decision_function(X)
 
         self.results['test_time'] = time.time() - start_time
         scores = scores.flatten()
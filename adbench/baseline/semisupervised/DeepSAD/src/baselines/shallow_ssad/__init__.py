@@ -1 +1,2 @@
 from .ssad_convex import ConvexSSAD
+from .ssad_smo import SMOSSAD
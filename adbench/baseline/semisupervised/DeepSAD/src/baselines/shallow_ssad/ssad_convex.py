@@ -3,9 +3,6 @@
 ########################################################################################################################
 import numpy as np
 
-from cvxopt import matrix, spmatrix, sparse, spdiag
-from cvxopt.solvers import qp
-
 
 class ConvexSSAD:
     """ Convex semi-supervised anomaly detection with hinge-loss and L2 regularizer
@@ -74,6 +71,10 @@ class ConvexSSAD:
         self.kernel = kernel
 
     def fit(self, check_psd_eigs=False):
+        # cvxopt is only needed by the dense QP solver (not by SMOSSAD)
+        from cvxopt import matrix, spmatrix, sparse, spdiag
+        from cvxopt.solvers import qp
+
         # number of training examples
         N = self.samples
 
@@ -135,20 +136,23 @@ class ConvexSSAD:
         print('- sum_(i in negatives) alpha_i = {0}'.format(np.sum(self.alphas[self.y ==-1])))
 
         # infer threshold (rho)
+        self.infer_threshold(self.kernel[np.ix_(self.svs, self.svs)])
+
+    def infer_threshold(self, kernel_svs):
+        """ Infer the threshold (rho) from the kernel between the support vectors (svs x svs).
+        """
         psvs = np.where(self.y[self.svs] == 0)[0]
         # case 1: unlabeled support vectors available
         self.threshold = 0.
         unl_threshold = -1e12
         lbl_threshold = -1e12
         if psvs.size > 0:
-            k = self.kernel[:, self.svs]
-            k = k[self.svs[psvs], :]
+            k = kernel_svs[psvs, :]
             unl_threshold = np.max(self.apply(k))
 
         if np.sum(self.cl) > 1e-12:
         # case 2: only labeled examples available
-            k = self.kernel[:, self.svs]
-            k = k[self.svs, :]
+            k = kernel_svs
             thres = self.apply(k)
             pinds = np.where(self.y[self.svs] == +1)[0]
             ninds = np.where(self.y[self.svs] == -1)[0]
@@ -0,0 +1,168 @@
+import numpy as np
+
+from collections import OrderedDict
+from scipy.optimize import linprog
+from .ssad_convex import ConvexSSAD
+
+
+class SMOSSAD(ConvexSSAD):
+    """ The same dual problem as ConvexSSAD, solved by an SMO-style working-set decomposition
+        instead of the dense cvxopt QP, so that the N x N kernel is never built:
+
+            minimize 0.5 sum_(i,j) alpha_i alpha_j cy_i cy_j k(x_i,x_j)
+        {0<=alpha_i<=C_i}
+            subject to  sum_i cy_i alpha_i = 1
+                        sum_(j labeled) alpha_j - s = kappa,  s >= 0  (slack of the inequality)
+
+        Each step moves the alphas along one elementary feasible direction of the two equality constraints
+        (a pair in the same group of unlabeled / positive / negative examples, or a triple of different groups,
+        possibly with the slack s), chosen by the maximal violation of the KKT conditions, with the exact line search.
+        Only the kernel columns of the working set are computed (and cached), i.e., O(N) memory per column.
+    """
+
+    def __init__(self, X, y, kernel_fn, kappa=1.0, Cp=1.0, Cu=1.0, Cn=1.0, tol=1e-4, max_iter=100000,
+                 cache_size=512):
+        """
+        :param X: training data (N x d)
+        :param kernel_fn: kernel function, kernel_fn(A, B) returns the kernel matrix between the rows of A and B
+        :param tol: stopping tolerance of the maximal KKT violation
+        :param max_iter: maximum number of the SMO steps
+        :param cache_size: memory (MB) of the kernel column cache
+        """
+        super().__init__(None, y, kappa=kappa, Cp=Cp, Cu=Cu, Cn=Cn)
+        self.X = X
+        self.kernel_fn = kernel_fn
+        self.tol = tol
+        self.max_iter = max_iter
+        self.n_cache = max(int(cache_size * 2 ** 20 // (8 * self.samples)), 8)
+        self.cache = OrderedDict()
+        self.n_iter = 0
+
+    def set_train_kernel(self, kernel):
+        # the parent's precomputed N x N kernel is exactly what SMOSSAD avoids
+        raise TypeError('SMOSSAD does not take a precomputed kernel, pass X and kernel_fn to the constructor instead.')
+
+    def column(self, k):
+        # the k-th column of Q = (cy cy') * K, in the order of the samples sorted by group (see fit)
+        if k in self.cache:
+            self.cache.move_to_end(k)
+            return self.cache[k]
+
+        col = self.kernel_fn(self.X_sorted, self.X_sorted[[k], :])[:, 0] * self.cy_sorted * self.cy_sorted[k]
+        self.cache[k] = col
+        if len(self.cache) > self.n_cache:
+            self.cache.popitem(last=False)
+        return col
+
+    def init_alphas(self):
+        """ A feasible starting point (a vertex of the feasible set) by a linear program.
+        """
+        A_eq = self.cy.reshape(1, -1).astype(float)
+        A_ub, b_ub = None, None
+        if self.labeled > 0:
+            # kappa <= sum_(j labeled) alpha_j
+            A_ub, b_ub = -self.cl.reshape(1, -1).astype(float), [-self.kappa]
+        res = linprog(np.zeros(self.samples), A_ub=A_ub, b_ub=b_ub, A_eq=A_eq, b_eq=[1.0],
+                      bounds=list(zip(np.zeros(self.samples), self.cC)), method='highs')
+        if res.status != 0:
+            raise ValueError('The SSAD dual problem is infeasible: {0}'.format(res.message))
+
+        return np.clip(res.x, 0, self.cC)
+
+    def fit(self, check_psd_eigs=False):
+        N = self.samples
+        # the samples are sorted by group (unlabeled, positive, negative), so that each group is a slice
+        order = np.argsort(np.select([self.y == 0, self.y == 1], [0, 1], 2), kind='stable')
+        self.X_sorted, self.cy_sorted = self.X[order, :], self.cy[order, 0]
+        self.cache.clear()
+        C = self.cC[order]
+        bounds = np.cumsum([0, np.sum(self.y == 0), np.sum(self.y == 1), np.sum(self.y == -1)])
+        groups = {g: slice(bounds[i], bounds[i + 1]) for i, g in enumerate(['u', 'p', 'n'])}
+
+        # elementary feasible directions: the coefficients of each group (and of the slack s)
+        directions = [{'u': 1, 'u_': -1}, {'p': 1, 'p_': -1}, {'n': 1, 'n_': -1}]
+        if self.labeled > 0:
+            for d in [{'u': -1, 'p': 1, 's': 1}, {'u': 1, 'n': 1, 's': 1},
+                      {'p': 1, 'n': 1, 's': 2}, {'u': -2, 'p': 1, 'n': -1}]:
+                directions += [d, {k: -v for k, v in d.items()}]
+
+        alpha = self.init_alphas()
+        s = np.sum(alpha[self.cl == 1]) - self.kappa if self.labeled > 0 else 0.0
+        alpha = alpha[order]
+        s = max(s, 0.0)
+        grad = np.zeros(N)
+        for k in np.where(alpha > 0)[0]:
+            grad += alpha[k] * self.column(k)
+
+        eps = 1e-12
+        for self.n_iter in range(self.max_iter):
+            # best member of each group: the smallest gradient to increase and the largest gradient to decrease
+            g_up, g_down = np.where(alpha < C - eps, grad, np.inf), np.where(alpha > eps, grad, -np.inf)
+            best = {}
+            for g, sl in groups.items():
+                if sl.start == sl.stop:
+                    best[g], best[g + '_'] = (np.inf, -1), (np.inf, -1)
+                    continue
+                i, j = sl.start + np.argmin(g_up[sl]), sl.start + np.argmax(g_down[sl])
+                best[g] = (g_up[i], i)
+                best[g + '_'] = (-g_down[j], j)  # (coefficient -1) * gradient
+
+            # the most violating direction
+            violation, selected = 0.0, None
+            for d in directions:
+                if d.get('s', 0) < 0 and s <= eps:
+                    continue
+                value = 0.0
+                for g, c in d.items():
+                    if g == 's':
+                        continue
+                    if c > 0:
+                        value += c * best[g][0]
+                    else:
+                        value += -c * best[g.rstrip('_') + '_'][0]
+                if value < violation:
+                    violation, selected = value, d
+
+            if selected is None or violation > -self.tol:
+                break
+
+            # working set of the selected direction
+            index, coef = [], []
+            for g, c in selected.items():
+                if g == 's':
+                    continue
+                index.append(best[g][1] if c > 0 else best[g.rstrip('_') + '_'][1])
+                coef.append(float(c))
+            index, coef = np.array(index), np.array(coef)
+
+            # maximal step in the box (and s >= 0)
+            t_max = np.min(np.where(coef > 0, (C[index] - alpha[index]) / coef, alpha[index] / -coef))
+            if selected.get('s', 0) < 0:
+                t_max = min(t_max, s / -selected['s'])
+
+            # exact line search of the quadratic objective
+            cols = [self.column(k) for k in index]
+            Q_ws = np.array([[col[k] for k in index] for col in cols])
+            curvature = coef @ Q_ws @ coef
+            t = min(t_max, -violation / curvature) if curvature > eps else t_max
+
+            alpha[index] = np.clip(alpha[index] + t * coef, 0, C[index])
+            s = max(s + t * selected.get('s', 0), 0.0)
+            for c, col in zip(coef, cols):
+                grad += t * c * col
+
+        self.alphas = np.empty(N)
+        self.alphas[order] = alpha
+        self.alphas = self.alphas.reshape(-1, 1)
+        self.cache.clear()
+        self.svs = np.where(self.alphas >= ConvexSSAD.PRECISION)[0]
+
+        print('Validate solution:')
+        print('- {0} SMO iterations, maximal KKT violation {1}'.format(self.n_iter + 1, -violation))
+        print('- found {0} support vectors'.format(len(self.svs)))
+        print('- sum_(i) alpha_i cy_i = {0} = 1.0'.format(np.sum(self.alphas*self.cy)))
+        print('- sum_(i in labeled) alpha_i = {0} >= {1} = kappa'.format(np.sum(self.alphas[self.cl == 1]), self.kappa))
+
+        # infer threshold (rho) from the kernel between the support vectors
+        X_svs = self.X[self.svs, :]
+        self.infer_threshold(self.kernel_fn(X_svs, X_svs))
@@ -6,9 +6,11 @@ import numpy as np
 
 from torch.utils.data import DataLoader
 from .shallow_ssad.ssad_convex import ConvexSSAD
+from .shallow_ssad.ssad_smo import SMOSSAD
 from sklearn.metrics import roc_auc_score
 from sklearn.metrics.pairwise import pairwise_kernels
 from base.base_dataset import BaseADDataset
+from .kernels import RBFKernelSweep
 from networks.main import build_autoencoder
 
 
@@ -17,9 +19,20 @@ class SSAD(object):
     A class for kernel SSAD models as described in Goernitz et al., Towards Supervised Anomaly Detection, JAIR, 2013.
     """
 
-    def __init__(self, kernel='rbf', kappa=1.0, Cp=1.0, Cu=1.0, Cn=1.0, hybrid=False):
-        """Init SSAD instance."""
+    def __init__(self, kernel='rbf', kappa=1.0, Cp=1.0, Cu=1.0, Cn=1.0, hybrid=False, kernel_dtype=np.float64,
+                 working_memory=1024, solver='cvxopt', smo_params=None):
+        """Init SSAD instance.
+
+        solver: 'cvxopt' solves the dual QP with the dense N x N kernel (cubic time, quadratic memory),
+        'smo' solves the same dual by the SMO-style decomposition with the kernel columns computed on the fly (SMOSSAD),
+        which scales to large training sets. smo_params are passed to SMOSSAD (tol, max_iter, cache_size).
+        """
+        assert solver in ['cvxopt', 'smo']
+        self.solver = solver
+        self.smo_params = {} if smo_params is None else smo_params
         self.kernel = kernel
+        # the rbf kernels of the gamma sweep are derived from the squared distances computed once
+        self.rbf_sweep = RBFKernelSweep(dtype=kernel_dtype, working_memory=working_memory) if kernel == 'rbf' else None
         self.kappa = kappa
         self.Cp = Cp
         self.Cu = Cu
@@ -95,14 +108,28 @@ class SSAD(object):
                                 X_test[perm][labels[perm] == 1][:n_val_outlier]))
         labels = np.array([0] * n_val_normal + [1] * n_val_outlier)
 
+        # Squared distances of the training and validation kernels (the same for all gammas),
+        # the training kernel is not built by the smo solver
+        if self.rbf_sweep is not None:
+            D = self.rbf_sweep.sqdist(X) if self.solver == 'cvxopt' else None
+            D_val = self.rbf_sweep.sqdist(X_val, X)
+
         i = 1
         for gamma in gammas:
 
-            # Build the training kernel
-            kernel = pairwise_kernels(X, X, metric=self.kernel, gamma=gamma)
+            if self.solver == 'smo':
+                # Model candidate (the kernel columns are computed by the solver)
+                kernel_fn = lambda A, B, gamma=gamma: pairwise_kernels(A, B, metric=self.kernel, gamma=gamma)
+                model = SMOSSAD(X, semi_targets, kernel_fn, Cp=self.Cp, Cu=self.Cu, Cn=self.Cn, **self.smo_params)
+            else:
+                # Build the training kernel (a new array, since the model keeps a reference to its kernel)
+                if self.rbf_sweep is not None:
+                    kernel = self.rbf_sweep.kernel(D, gamma)
+                else:
+                    kernel = pairwise_kernels(X, X, metric=self.kernel, gamma=gamma)
 
-            # Model candidate
-            model = ConvexSSAD(kernel, semi_targets, Cp=self.Cp, Cu=self.Cu, Cn=self.Cn)
+                # Model candidate
+                model = ConvexSSAD(kernel, semi_targets, Cp=self.Cp, Cu=self.Cu, Cn=self.Cn)
 
             # Train
             start_time = time.time()
@@ -110,7 +137,10 @@ class SSAD(object):
             train_time = time.time() - start_time
 
             # Test on small hold-out set from test set
-            kernel_val = pairwise_kernels(X_val, X[model.svs, :], metric=self.kernel, gamma=gamma)
+            if self.rbf_sweep is not None:
+                kernel_val = self.rbf_sweep.kernel(D_val[:, model.svs], gamma)
+            else:
+                kernel_val = pairwise_kernels(X_val, X[model.svs, :], metric=self.kernel, gamma=gamma)
             scores = (-1.0) * model.apply(kernel_val)
             scores = scores.flatten()
 
@@ -133,8 +163,12 @@ class SSAD(object):
 
         # If hybrid, also train a model with linear kernel
         if self.hybrid:
-            linear_kernel = pairwise_kernels(X, X, metric='linear')
-            self.linear_model = ConvexSSAD(linear_kernel, semi_targets, Cp=self.Cp, Cu=self.Cu, Cn=self.Cn)
+            if self.solver == 'smo':
+                self.linear_model = SMOSSAD(X, semi_targets, lambda A, B: pairwise_kernels(A, B, metric='linear'),
+                                            Cp=self.Cp, Cu=self.Cu, Cn=self.Cn, **self.smo_params)
+            else:
+                linear_kernel = pairwise_kernels(X, X, metric='linear')
+                self.linear_model = ConvexSSAD(linear_kernel, semi_targets, Cp=self.Cp, Cu=self.Cu, Cn=self.Cn)
             start_time = time.time()
             self.linear_model.fit()
             train_time = time.time() - start_time
@@ -172,7 +206,10 @@ class SSAD(object):
         start_time = time.time()
 
         # Build kernel
-        kernel = pairwise_kernels(X, self.X_svs, metric=self.kernel, gamma=self.gamma)
+        if self.rbf_sweep is not None:
+            kernel = self.rbf_sweep.kernel(self.rbf_sweep.sqdist(X, self.X_svs), self.gamma)
+        else:
+            kernel = pairwise_kernels(X, self.X_svs, metric=self.kernel, gamma=self.gamma)
 
         scores = (-1.0) * self.model.apply(kernel)
 
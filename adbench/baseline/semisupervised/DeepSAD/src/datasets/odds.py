@@ -1,6 +1,7 @@
 from torch.utils.data import DataLoader
 from adbench.baseline.semisupervised.DeepSAD.src.base import BaseADDataset
 from adbench.baseline.semisupervised.DeepSAD.src.base.odds_dataset import ODDSDataset
+from adbench.myutils import TensorBatches
 
 
 class ODDSADDataset(BaseADDataset):
@@ -26,11 +27,12 @@ class ODDSADDataset(BaseADDataset):
     def loaders(self, batch_size: int, shuffle_train=True, shuffle_test=False, num_workers: int = 0) -> (
             DataLoader, DataLoader):
 
+        # the whole set is already an in-memory tensor, the batches are sliced directly (num_workers is not needed)
         if self.train:
-            train_loader = DataLoader(dataset=self.train_set, batch_size=batch_size, shuffle=shuffle_train,
-                                      num_workers=num_workers, drop_last=True)
+            train_loader = TensorBatches(*self.train_set.tensors(), batch_size=batch_size, shuffle=shuffle_train,
+                                         drop_last=True)
             return train_loader
         else:
-            test_loader = DataLoader(dataset=self.test_set, batch_size=batch_size, shuffle=shuffle_test,
-                                     num_workers=num_workers, drop_last=False)
+            test_loader = TensorBatches(*self.test_set.tensors(), batch_size=batch_size, shuffle=shuffle_test,
+                                        drop_last=False)
             return test_loader
\ No newline at end of file
@@ -90,6 +90,14 @@ class deepsad(object):
 
         return score
 
+    def score(self, X, device: str = 'cuda', batch_size: int = 8192):
+        """Scores the array X with the Deep SAD model (in large batches)."""
+
+        if self.trainer is None:
+            self.trainer = DeepSADTrainer(self.c, self.eta, device=device)
+
+        return self.trainer.score(X, self.net, batch_size=batch_size)
+
     def pretrain(self, dataset: BaseADDataset, input_size ,optimizer_name: str = 'adam', lr: float = 0.001, n_epochs: int = 100,
                  lr_milestones: tuple = (), batch_size: int = 128, weight_decay: float = 1e-6, device: str = 'cuda',
                  n_jobs_dataloader: int = 0):
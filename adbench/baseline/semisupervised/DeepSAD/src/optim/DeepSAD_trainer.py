@@ -65,8 +65,8 @@ class DeepSADTrainer(BaseTrainer):
                 inputs, _, semi_targets, _ = data
                 inputs, semi_targets = inputs.to(self.device), semi_targets.to(self.device)
 
-                # transfer the label "1" to "-1" for the inverse loss
-                semi_targets[semi_targets==1] = -1
+                # transfer the label "1" to "-1" for the inverse loss (not in-place, the batch may be a view of the training set)
+                semi_targets = torch.where(semi_targets == 1, -1, semi_targets)
 
                 # Zero the network parameter gradients
                 optimizer.zero_grad()
@@ -110,38 +110,32 @@ class DeepSADTrainer(BaseTrainer):
         epoch_loss = 0.0
         n_batches = 0
         start_time = time.time()
-        idx_label_score = []
+        idx, labels, scores = [], [], []
         net.eval()
-        with torch.no_grad():
+        with torch.inference_mode():
             for data in test_loader:
-                inputs, labels, semi_targets, idx = data
+                inputs, label_batch, semi_targets, idx_batch = data
 
                 inputs = inputs.to(self.device)
-                labels = labels.to(self.device)
                 semi_targets = semi_targets.to(self.device)
-                idx = idx.to(self.device)
 
                 outputs = net(inputs)
                 dist = torch.sum((outputs - self.c) ** 2, dim=1)
                 losses = torch.where(semi_targets == 0, dist, self.eta * ((dist + self.eps) ** semi_targets.float()))
                 loss = torch.mean(losses)
-                scores = dist
 
-                # Save triples of (idx, label, score) in a list
-                idx_label_score += list(zip(idx.cpu().data.numpy().tolist(),
-                                            labels.cpu().data.numpy().tolist(),
-                                            scores.cpu().data.numpy().tolist()))
+                # Save the (idx, label, score) of the batch, concatenated once after testing
+                idx.append(idx_batch); labels.append(label_batch); scores.append(dist.cpu())
 
                 epoch_loss += loss.item()
                 n_batches += 1
 
         self.test_time = time.time() - start_time
-        self.test_scores = idx_label_score
+        idx, labels = torch.cat(idx).numpy(), torch.cat(labels).numpy()
+        scores = torch.cat(scores).numpy().astype(np.float64)
+        self.test_scores = (idx, labels, scores)
 
         # Compute AUC
-        _, labels, scores = zip(*idx_label_score)
-        # labels = np.array(labels)
-        scores = np.array(scores)
         # self.test_aucroc = roc_auc_score(labels, scores)
         # self.test_aucpr = average_precision_score(labels, scores, pos_label = 1)
 
@@ -154,6 +148,22 @@ class DeepSADTrainer(BaseTrainer):
 
         return scores
 
+    def score(self, X, net: BaseNet, batch_size: int = None):
+        """Anomaly scores (the squared distances to the center c) of the array X, no labels are needed."""
+        batch_size = self.batch_size if batch_size is None else batch_size
+        X = torch.as_tensor(np.asarray(X), dtype=torch.float32)
+        scores = np.empty(X.size(0), dtype=np.float64)
+
+        # Set device for network
+        net = net.to(self.device)
+        net.eval()
+        with torch.inference_mode():
+            for start in range(0, X.size(0), batch_size):
+                outputs = net(X[start:start + batch_size].to(self.device))
+                scores[start:start + batch_size] = torch.sum((outputs - self.c) ** 2, dim=1).cpu().numpy()
+
+        return scores
+
     def init_center_c(self, train_loader: DataLoader, net: BaseNet, eps=0.1):
         """Initialize hypersphere center c as the mean from an initial forward pass on the data."""
         n_samples = 0
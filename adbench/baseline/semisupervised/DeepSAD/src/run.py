@@ -4,14 +4,23 @@ import random
 import numpy as np
 import pandas as pd
 import os
+import hashlib
+from collections import OrderedDict
 from .utils.config import Config
 from .utils.visualization.plot_images_grid import plot_images_grid
 from .deepsad import deepsad
+from .networks import build_autoencoder
 from .datasets.main import load_dataset
+from .optim.DeepSAD_trainer import DeepSADTrainer
 from adbench.myutils import Utils
 
 class DeepSAD():
-    def __init__(self, seed, model_name='DeepSAD'):
+    # the pretrained autoencoders (and the initialized centers c) shared by all the DeepSAD instances,
+    # the AE pretraining only uses X_train, so it is the same over the la sweep of one split (dataset, seed)
+    ae_cache = OrderedDict()
+    ae_cache_size = 16
+
+    def __init__(self, seed, model_name='DeepSAD', cache_pretrain:bool=True, score_batch_size:int=8192):
         self.utils = Utils()
         self.device = self.utils.get_device()  # get device
         self.seed = seed
@@ -36,6 +45,74 @@ class DeepSAD():
         self.ae_weight_decay = 1e-6
         self.num_threads = 0
         self.n_jobs_dataloader = 0
+        self.cache_pretrain = cache_pretrain # whether to reuse the pretrained autoencoder of the same split
+        self.score_batch_size = score_batch_size # batch size in the inference
+
+    def pretrain_key(self, X_train):
+        # fingerprint of the training split and all the settings which the pretraining (and the center c) depends on
+        X_train = np.ascontiguousarray(X_train)
+        fingerprint = hashlib.md5(X_train.tobytes() + str((X_train.shape, X_train.dtype)).encode()).hexdigest()
+        return (fingerprint, self.seed, self.net_name, str(self.device), self.ae_optimizer_name, self.ae_lr,
+                self.ae_n_epochs, tuple(self.ae_lr_milestone), self.ae_batch_size, self.ae_weight_decay, self.batch_size)
+
+    def rng_state(self):
+        state = {'torch': torch.get_rng_state(), 'numpy': np.random.get_state(), 'random': random.getstate()}
+        if torch.cuda.is_available():
+            state['cuda'] = torch.cuda.get_rng_state_all()
+        return state
+
+    def set_rng_state(self, state):
+        torch.set_rng_state(state['torch'])
+        np.random.set_state(state['numpy'])
+        random.setstate(state['random'])
+        if 'cuda' in state:
+            torch.cuda.set_rng_state_all(state['cuda'])
+
+    def pretrain_cached(self, dataset, input_size, X_train):
+        """
+        pretrain the autoencoder and initialize the center c, or load them from the cache.
+        The random states after the initialization of c are cached as well,
+        so that the following Deep SAD training is the same as the one without the cache
+        """
+        key = self.pretrain_key(X_train) if self.cache_pretrain else None
+        if key is not None and key in DeepSAD.ae_cache:
+            DeepSAD.ae_cache.move_to_end(key)
+            cache = DeepSAD.ae_cache[key]
+
+            self.deepSAD.ae_net = build_autoencoder(self.net_name, input_size)
+            self.deepSAD.ae_net.load_state_dict(cache['ae_net_dict'])
+            self.deepSAD.ae_results['train_time'] = cache['train_time']
+            self.deepSAD.init_network_weights_from_pretraining()
+            self.deepSAD.c = cache['c']
+            self.set_rng_state(cache['rng_state'])
+            logging.info('Loading the pretrained autoencoder from the cache.')
+            return
+
+        # Pretrain model on dataset (via autoencoder)
+        self.deepSAD.pretrain(dataset,
+                              input_size,
+                              optimizer_name=self.ae_optimizer_name,
+                              lr=self.ae_lr,
+                              n_epochs=self.ae_n_epochs,
+                              lr_milestones=self.ae_lr_milestone,
+                              batch_size=self.ae_batch_size,
+                              weight_decay=self.ae_weight_decay,
+                              device=self.device,
+                              n_jobs_dataloader=self.n_jobs_dataloader)
+
+        # Initialize hypersphere center c (the same as in DeepSADTrainer.train)
+        trainer = DeepSADTrainer(None, self.eta, batch_size=self.batch_size, device=self.device,
+                                 n_jobs_dataloader=self.n_jobs_dataloader)
+        train_loader = dataset.loaders(batch_size=self.batch_size, num_workers=self.n_jobs_dataloader)
+        self.deepSAD.c = trainer.init_center_c(train_loader, self.deepSAD.net.to(self.device)).cpu().data.numpy().tolist()
+
+        if key is not None:
+            DeepSAD.ae_cache[key] = {'ae_net_dict': {k: v.detach().cpu().clone() for k, v in self.deepSAD.ae_net.state_dict().items()},
+                                     'train_time': self.deepSAD.ae_results['train_time'],
+                                     'c': self.deepSAD.c,
+                                     'rng_state': self.rng_state()}
+            while len(DeepSAD.ae_cache) > DeepSAD.ae_cache_size:
+                DeepSAD.ae_cache.popitem(last=False)
 
     def fit(self, X_train, y_train, ratio=None):
         """
@@ -71,8 +148,8 @@ class DeepSAD():
             logging.info('Loading model from %s.' % self.load_model)
 
         logging.info('Pretraining: %s' % self.pretrain)
-        if self.pretrain:
-            # Pretrain model on dataset (via autoencoder)
+        if self.pretrain and self.load_model:
+            # Pretrain model on dataset (via autoencoder), the center c is loaded with the model
             self.deepSAD.pretrain(dataset,
                              input_size,
                              optimizer_name=self.ae_optimizer_name,
@@ -83,6 +160,9 @@ class DeepSAD():
                              weight_decay=self.ae_weight_decay,
                              device=self.device,
                              n_jobs_dataloader=self.n_jobs_dataloader)
+        elif self.pretrain:
+            # Pretrain model on dataset (via autoencoder), or reuse the pretrained one of the same split
+            self.pretrain_cached(dataset, input_size, X_train)
 
         # Train model on dataset
         self.deepSAD.train(dataset,
@@ -101,16 +181,13 @@ class DeepSAD():
         # cfg.save_config(export_json=xp_path + '/config.json')
 
         # Plot most anomalous and most normal test samples
-        # indices, labels, scores = zip(*deepSAD.results['test_scores'])
-        # indices, labels, scores = np.array(indices), np.array(labels), np.array(scores)
+        # indices, labels, scores = deepSAD.results['test_scores']
         # idx_all_sorted = indices[np.argsort(scores)]  # from lowest to highest score
         # idx_normal_sorted = indices[labels == 0][np.argsort(scores[labels == 0])]  # from lowest to highest score
 
         return self
 
     def predict_score(self, X):
-        # input randomly generated y label for consistence
-        dataset = load_dataset(data={'X_test': X, 'y_test': np.random.choice([0, 1], X.shape[0])}, train=False)
-        score = self.deepSAD.test(dataset, device=self.device, n_jobs_dataloader=self.n_jobs_dataloader)
+        score = self.deepSAD.score(X, device=self.device, batch_size=self.score_batch_size)
 
         return score
\ No newline at end of file
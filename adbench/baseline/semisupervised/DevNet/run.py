@@ -16,7 +16,7 @@ from keras import regularizers
 from keras import backend as K
 from keras.models import Model, load_model
 from keras.layers import Input, Dense
-from keras.callbacks import ModelCheckpoint, TensorBoard
+from keras.callbacks import TensorBoard
 
 try:
     from keras.optimizers import RMSprop # old tf version
@@ -30,15 +30,15 @@ from scipy.special import comb
 import matplotlib.pyplot as plt
 import sys
 import os
-from scipy.sparse import vstack, csc_matrix
+from scipy.sparse import vstack, csc_matrix, issparse
 # from utils import dataLoading, aucPerformance, writeResults, get_data_from_svmlight_file
 from adbench.baseline.semisupervised.DevNet.utils import dataLoading, aucPerformance
 from sklearn.model_selection import train_test_split
-from adbench.myutils import Utils
+from adbench.myutils import Utils, BestWeights
 import time
 
 class DevNet():
-    def __init__(self, seed, model_name='DevNet', save_suffix='test'):
+    def __init__(self, seed, model_name='DevNet', save_suffix='test', save_weights:bool=False):
         self.utils = Utils()
         self.device = self.utils.get_device()  # get device
         self.seed = seed
@@ -71,11 +71,15 @@ class DevNet():
         # random_seed = args.ramdn_seed
 
         self.save_suffix = save_suffix
+        # the best weights are kept in memory, and only saved to a unique path per run if save_weights is True
+        self.save_weights = save_weights
 
         self.modelpath = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'model')
         if not os.path.exists(self.modelpath):
             os.makedirs(self.modelpath)
         self.ref = None # normal distribution reference, created for reusing across subsequent function calls
+        self.scoring_network = None # compiled network (with the best weights) kept after fit for the scoring
+        self.score_batch_size = 8192 # chunk size for the scoring, which bounds the memory of scoring
 
     def dev_network_d(self,input_shape):
         '''
@@ -141,71 +145,49 @@ class DevNet():
         model.compile(loss=self.deviation_loss, optimizer=rms)
         return model
 
-    def batch_generator_sup(self, x, outlier_indices, inlier_indices, batch_size, nb_batch, rng):
-        """batch generator
-        """
-        rng = np.random.RandomState(rng.randint(self.MAX_INT, size = 1))
-        counter = 0
-        while 1:
-            ref, training_labels = self.input_batch_generation_sup(x, outlier_indices, inlier_indices, batch_size, rng)
-            counter += 1
-            yield(ref, training_labels)
-            if (counter > nb_batch):
-                counter = 0
-
-    def input_batch_generation_sup(self, X_train, outlier_indices, inlier_indices, batch_size, rng):
+    def batch_index_sup(self, outlier_indices, inlier_indices, batch_size, rng):
         '''
-        batchs of samples. This is for csv data.
-        Alternates between positive and negative pairs.
+        indices of one batch, alternates between inliers (even positions) and outliers (odd positions),
+        both are drawn uniformly with replacement, i.e., the same distribution as the original per-row sampling
         '''
-        dim = X_train.shape[1]
-        ref = np.empty((batch_size, dim))
-        training_labels = []
         n_inliers = len(inlier_indices)
         n_outliers = len(outlier_indices)
-        for i in range(batch_size):
-            if(i % 2 == 0):
-                sid = rng.choice(n_inliers, 1)
-                ref[i] = X_train[inlier_indices[sid]]
-                training_labels += [0]
-            else:
-                sid = rng.choice(n_outliers, 1)
-                ref[i] = X_train[outlier_indices[sid]]
-                training_labels += [1]
-        return np.array(ref), np.array(training_labels, dtype=float)
-
-    def input_batch_generation_sup_sparse(self, X_train, outlier_indices, inlier_indices, batch_size, rng):
-        '''
-        batchs of samples. This is for libsvm stored sparse data.
-        Alternates between positive and negative pairs.
-        '''
-        ref = np.empty((batch_size))
-        training_labels = []
-        n_inliers = len(inlier_indices)
-        n_outliers = len(outlier_indices)
-        for i in range(batch_size):
-            if(i % 2 == 0):
-                sid = rng.choice(n_inliers, 1)
-                ref[i] = inlier_indices[sid]
-                training_labels += [0]
-            else:
-                sid = rng.choice(n_outliers, 1)
-                ref[i] = outlier_indices[sid]
-                training_labels += [1]
-        ref = X_train[ref, :].toarray()
-        return ref, np.array(training_labels)
-
-    def load_model_weight_predict(self, model_name, input_shape, network_depth, X_test):
+        index = np.empty(batch_size, dtype=np.int64)
+        index[0::2] = inlier_indices[rng.randint(n_inliers, size=(batch_size + 1) // 2)]
+        index[1::2] = outlier_indices[rng.randint(n_outliers, size=batch_size // 2)]
+        training_labels = np.zeros(batch_size, dtype=float)
+        training_labels[1::2] = 1
+
+        return index, training_labels
+
+    def batch_dataset_sup(self, X_train, outlier_indices, inlier_indices, batch_size, rng):
         '''
-        load the saved weights to make predictions
+        tf.data pipeline of the training batches, the indices are drawn sequentially (seeded by rng),
+        while the rows are gathered in parallel and prefetched, so that the sampling overlaps with the training
         '''
-        model = self.deviation_network(input_shape, network_depth)
-        model.load_weights(model_name)
-        scoring_network = Model(inputs=model.input, outputs=model.output)
+        rng = np.random.RandomState(rng.randint(self.MAX_INT, size = 1))
+        dim = X_train.shape[1]
+
+        def index_generator():
+            while 1:
+                yield self.batch_index_sup(outlier_indices, inlier_indices, batch_size, rng)
+
+        def gather(index):
+            # for the csr input, only the rows of the current batch are densified
+            ref = X_train[index]
+            return ref.toarray().astype(np.float32) if issparse(ref) else np.asarray(ref, dtype=np.float32)
+
+        def gather_batch(index, training_labels):
+            ref = tf.numpy_function(gather, [index], tf.float32)
+            ref.set_shape((batch_size, dim))
+            return ref, training_labels
 
-        scores = scoring_network.predict(X_test)
+        dataset = tf.data.Dataset.from_generator(index_generator,
+                                                 output_signature=(tf.TensorSpec(shape=(batch_size,), dtype=tf.int64),
+                                                                   tf.TensorSpec(shape=(batch_size,), dtype=tf.float32)))
+        dataset = dataset.map(gather_batch, num_parallel_calls=tf.data.AUTOTUNE).prefetch(tf.data.AUTOTUNE)
 
-        return scores
+        return dataset
 
     def fit(self, X_train, y_train, ratio=None):
         #index
@@ -225,19 +207,22 @@ class DevNet():
         batch_size = self.args.batch_size
         nb_batch = self.args.nb_batch
         self.model = self.deviation_network(self.input_shape, self.network_depth)
-        self.model_name = os.path.join(self.modelpath,'devnet_'+self.save_suffix+'.h5')
-        checkpointer = ModelCheckpoint(self.model_name, monitor='loss', verbose=0,
-                                       save_best_only = True, save_weights_only = True)
+        self.model_name = BestWeights.unique_path(self.modelpath, 'devnet_'+self.save_suffix) if self.save_weights else None
+        checkpointer = BestWeights(monitor='loss', save_path=self.model_name)
 
-        self.model.fit_generator(self.batch_generator_sup(X_train, outlier_indices, inlier_indices, batch_size, nb_batch, rng),
-                                  steps_per_epoch = nb_batch,
-                                  epochs = epochs,
-                                  callbacks=[checkpointer])
+        self.model.fit(self.batch_dataset_sup(X_train, outlier_indices, inlier_indices, batch_size, rng),
+                       steps_per_epoch = nb_batch,
+                       epochs = epochs,
+                       callbacks=[checkpointer])
+        self.best_weights = checkpointer.best_weights
+        # the best weights are restored by the callback, the trained network is directly used for scoring
+        self.scoring_network = self.model
 
         return self
 
     def predict_score(self, X):
-        score = self.load_model_weight_predict(self.model_name, self.input_shape, self.network_depth, X)
-        # score = self.model.predict(X)
+        # the network is not rebuilt on each call, the scores are computed with predict_on_batch over large chunks
+        # (streamed with prefetch, the csr input is densified chunk by chunk), which avoids the per-call overhead of predict
+        score = self.utils.predict_chunked(self.scoring_network.predict_on_batch, X, chunk_size=self.score_batch_size)
 
         return score
\ No newline at end of file
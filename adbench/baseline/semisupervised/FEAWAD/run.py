@@ -17,15 +17,14 @@ import argparse
 import numpy as np
 import os
 import sys
-from scipy.sparse import vstack, csc_matrix
-from adbench.myutils import Utils
+from scipy.sparse import vstack, csc_matrix, csr_matrix, issparse
+from adbench.myutils import Utils, RNGStream, BestWeights
 import gc
 
 import tensorflow as tf
 from keras import backend as K
 from keras.models import Model
 from keras.layers import Input, Dense, Subtract,concatenate,Lambda,Reshape
-from keras.callbacks import ModelCheckpoint
 from keras.losses import mean_squared_error
 
 try:
@@ -39,11 +38,11 @@ from tensorflow.python.framework.ops import disable_eager_execution
 disable_eager_execution()
 
 class FEAWAD():
-    def __init__(self, seed, model_name='FEAWAD', save_suffix='test'):
+    def __init__(self, seed, model_name='FEAWAD', save_suffix='test', save_weights:bool=False):
         self.utils = Utils()
         self.device = self.utils.get_device()  # get device
         self.seed = seed
-        self.MAX_INT = np.iinfo(np.int32).max
+        self.rng_stream = RNGStream(seed)  # random streams of the batch generators
 
         # self.sess = tf.Session() #for old version tf
         self.sess = tf.compat.v1.Session()
@@ -73,6 +72,9 @@ class FEAWAD():
         self.data_format = 0
 
         self.save_suffix = save_suffix
+        # the best weights are kept in memory, and only saved to a unique path per run if save_weights is True
+        self.save_weights = save_weights
+        self.score_batch_size = 8192 # chunk size for the scoring, which bounds the memory of scoring
 
         self.modelpath = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'model')
         if not os.path.exists(self.modelpath):
@@ -89,7 +91,7 @@ class FEAWAD():
         de2 = Dense(length, kernel_initializer='glorot_normal',use_bias=True,activation='relu',name = 'ad2')(de1)
 
         model =  Model(x_input, de2)
-        adm = Adam(lr=0.0001)
+        adm = Adam(learning_rate=0.0001)
         model.compile(loss=mean_squared_error, optimizer=adm)
 
         return model
@@ -109,7 +111,10 @@ class FEAWAD():
 
         if testflag==0:
             AEmodel = Model(x_input,de2)
-            AEmodel.load_weights(modelname)
+            if isinstance(modelname, str):
+                AEmodel.load_weights(modelname)
+            else:
+                AEmodel.set_weights(modelname) # in-memory weights of the pretrained autoencoder
             print('load autoencoder model')
 
             sub_result = Subtract()([x_input, de2]) # reconstruction residual error
@@ -152,7 +157,7 @@ class FEAWAD():
 
             return loss1
 
-        adm = Adam(lr=0.0001)
+        adm = Adam(learning_rate=0.0001)
         dev_model.compile(loss=multi_loss, optimizer=adm)
 
         return dev_model
@@ -170,126 +175,85 @@ class FEAWAD():
             sys.exit("The network depth is not set properly")
         return model
 
-    def auto_encoder_batch_generator_sup(self, x, inlier_indices, batch_size, nb_batch, rng):
-        """auto encoder batch generator
-        """
-        self.utils.set_seed(self.seed)
-        # rng = np.random.RandomState(rng.randint(self.MAX_INT, size = 1))
-        rng = np.random.RandomState(np.random.randint(self.MAX_INT, size=1))
-        counter = 0
-        while 1:
-            if self.data_format == 0:
-                ref, training_labels = self.AE_input_batch_generation_sup(x, inlier_indices, batch_size, rng)
-            else:
-                ref, training_labels = self.input_batch_generation_sup_sparse(x, inlier_indices, batch_size, rng)
-            counter += 1
-            yield(ref, training_labels)
-            if (counter > nb_batch):
-                counter = 0
+    def AE_batch_index(self, inlier_indices, batch_size, rng):
+        return inlier_indices[rng.integers(len(inlier_indices), size=batch_size)]
 
-    def AE_input_batch_generation_sup(self, train_x, inlier_indices, batch_size, rng):
+    def batch_index_sup(self, outlier_indices, inlier_indices, batch_size, rng):
         '''
-        batchs of samples. This is for csv data.
-        Alternates between positive and negative pairs.
+        indices of one batch, alternates between inliers (even positions) and outliers (odd positions),
+        both are drawn uniformly with replacement
         '''
-        rng = np.random.RandomState(self.seed)
+        index = np.empty(batch_size, dtype=np.int64)
+        index[0::2] = inlier_indices[rng.integers(len(inlier_indices), size=(batch_size + 1) // 2)]
+        index[1::2] = outlier_indices[rng.integers(len(outlier_indices), size=batch_size // 2)]
+        training_labels = np.zeros(batch_size, dtype=float)
+        training_labels[1::2] = 1
 
-        dim = train_x.shape[1]
-        ref = np.empty((batch_size, dim))
-        training_labels = np.empty((batch_size, dim))
-        n_inliers = len(inlier_indices)
-        for i in range(batch_size):
-            sid = rng.choice(n_inliers, 1)
-            ref[i] = train_x[inlier_indices[sid]]
-            training_labels[i] = train_x[inlier_indices[sid]]
-        return np.array(ref), np.array(training_labels, dtype=float)
-
-    def batch_generator_sup(self, x, outlier_indices, inlier_indices, batch_size, nb_batch, rng):
-        """batch generator
-        """
-        self.utils.set_seed(self.seed)
-        # rng = np.random.RandomState(rng.randint(self.MAX_INT, size = 1))
-        rng = np.random.RandomState(np.random.randint(self.MAX_INT, size=1))
-        counter = 0
-        while 1:
-            if self.data_format == 0:
-                ref, training_labels = self.input_batch_generation_sup(x, outlier_indices, inlier_indices, batch_size, rng)
-            else:
-                ref, training_labels = self.input_batch_generation_sup_sparse(x, outlier_indices, inlier_indices, batch_size, rng)
-            counter += 1
-            yield(ref, training_labels)
-            if (counter > nb_batch):
-                counter = 0
+        return index, training_labels
 
-    def input_batch_generation_sup(self, train_x, outlier_indices, inlier_indices, batch_size, rng):
+    def batch_dataset(self, train_x, index_generator, batch_size, autoencoder=False):
         '''
-        batchs of samples. This is for csv data.
-        Alternates between positive and negative pairs.
+        tf.data pipeline of the training batches, the indices are drawn sequentially by index_generator,
+        while the rows are gathered in parallel and prefetched, so that the sampling overlaps with the training.
+        For the autoencoder, index_generator yields only the indices and the target is the input itself,
+        otherwise it yields the indices and the training labels
         '''
-        rng = np.random.RandomState(self.seed)
         dim = train_x.shape[1]
-        ref = np.empty((batch_size, dim))
-        training_labels = []
-        n_inliers = len(inlier_indices)
-        n_outliers = len(outlier_indices)
-        for i in range(batch_size):
-            if(i % 2 == 0):
-                sid = rng.choice(n_inliers, 1)
-                ref[i] = train_x[inlier_indices[sid]]
-                training_labels += [0]
-            else:
-                sid = rng.choice(n_outliers, 1)
-                ref[i] = train_x[outlier_indices[sid]]
-                training_labels += [1]
-        return np.array(ref), np.array(training_labels, dtype=float)
 
-    def input_batch_generation_sup_sparse(self, train_x, outlier_indices, inlier_indices, batch_size, rng):
-        '''
-        batchs of samples. This is for libsvm stored sparse data.
-        Alternates between positive and negative pairs.
-        '''
-        rng = np.random.RandomState(self.seed)
-        ref = np.empty((batch_size))
-        training_labels = []
-        n_inliers = len(inlier_indices)
-        n_outliers = len(outlier_indices)
-        for i in range(batch_size):
-            if(i % 2 == 0):
-                sid = rng.choice(n_inliers, 1)
-                ref[i] = inlier_indices[sid]
-                training_labels += [0]
-            else:
-                sid = rng.choice(n_outliers, 1)
-                ref[i] = outlier_indices[sid]
-                training_labels += [1]
-        ref = train_x[ref, :].toarray()
-        return ref, np.array(training_labels, dtype=float)
+        def gather(index):
+            # for the csr input, only the rows of the current batch are densified
+            ref = train_x[index]
+            return ref.toarray().astype(np.float32) if issparse(ref) else np.asarray(ref, dtype=np.float32)
+
+        def gather_rows(index):
+            ref = tf.numpy_function(gather, [index], tf.float32)
+            ref.set_shape((batch_size, dim))
+            return ref
+
+        index_spec = tf.TensorSpec(shape=(batch_size,), dtype=tf.int64)
+        if autoencoder:
+            dataset = tf.data.Dataset.from_generator(index_generator, output_signature=index_spec)
+            dataset = dataset.map(lambda index: (gather_rows(index),) * 2, num_parallel_calls=tf.data.AUTOTUNE)
+        else:
+            dataset = tf.data.Dataset.from_generator(index_generator,
+                                                     output_signature=(index_spec,
+                                                                       tf.TensorSpec(shape=(batch_size,), dtype=tf.float32)))
+            dataset = dataset.map(lambda index, training_labels: (gather_rows(index), training_labels),
+                                  num_parallel_calls=tf.data.AUTOTUNE)
+
+        return dataset.prefetch(tf.data.AUTOTUNE)
+
+    def AE_batch_dataset(self, train_x, inlier_indices, batch_size):
+        rng = self.rng_stream.generator(0)
+
+        def index_generator():
+            while 1:
+                yield self.AE_batch_index(inlier_indices, batch_size, rng)
+
+        return self.batch_dataset(train_x, index_generator, batch_size, autoencoder=True)
+
+    def dev_batch_dataset(self, train_x, outlier_indices, inlier_indices, batch_size):
+        rng = self.rng_stream.generator(1)
+
+        def index_generator():
+            while 1:
+                yield self.batch_index_sup(outlier_indices, inlier_indices, batch_size, rng)
+
+        return self.batch_dataset(train_x, index_generator, batch_size)
 
     def load_model_weight_predict(self, model_name, input_shape, network_depth, test_x):
         '''
-        load the saved weights to make predictions
+        load the weights (in-memory weights or the path of the saved weights) to make predictions
         '''
         model = self.deviation_network(input_shape, network_depth,model_name,1)
-        model.load_weights(model_name)
+        if isinstance(model_name, str):
+            model.load_weights(model_name)
+        else:
+            model.set_weights(model_name)
         scoring_network = Model(inputs=model.input, outputs=model.output)
 
-        if self.data_format == 0:
-            scores = scoring_network.predict(test_x)
-        else:
-            data_size = test_x.shape[0]
-            scores = np.zeros([data_size, 1])
-            count = 512
-            i = 0
-            while i < data_size:
-                subset = test_x[i:count].toarray()
-                scores[i:count] = scoring_network.predict(subset)
-                if i % 1024 == 0:
-                    print(i)
-                i = count
-                count += 512
-                if count > data_size:
-                    count = data_size
-            assert count == data_size
+        # the test set (dense or csr) is streamed in chunks with prefetch, so the memory is bounded
+        scores = self.utils.predict_chunked(scoring_network.predict_on_batch, test_x, chunk_size=self.score_batch_size)
         return scores
 
     def inject_noise_sparse(self, seed, n_out, random_seed):
@@ -302,17 +266,19 @@ class FEAWAD():
         n_sample, dim = seed.shape
         swap_ratio = 0.05
         n_swap_feat = int(swap_ratio * dim)
-        seed = seed.tocsc()
-        noise = csc_matrix((n_out, dim))
-        print(noise.shape)
+        seed = seed.tocsr()
+        # the same random draws as before, the noise matrix is then built with the sparse operations at once
+        outlier_idx = np.empty((n_out, 2), dtype=int)
+        swap_feats = np.empty((n_out, n_swap_feat), dtype=int)
         for i in np.arange(n_out):
-            outlier_idx = rng.choice(n_sample, 2, replace = False)
-            o1 = seed[outlier_idx[0]]
-            o2 = seed[outlier_idx[1]]
-            swap_feats = rng.choice(dim, n_swap_feat, replace = False)
-            noise[i] = o1.copy()
-            noise[i, swap_feats] = o2[0, swap_feats]
-        return noise.tocsr()
+            outlier_idx[i] = rng.choice(n_sample, 2, replace = False)
+            swap_feats[i] = rng.choice(dim, n_swap_feat, replace = False)
+        swap_mask = csr_matrix((np.ones(n_out * n_swap_feat), (np.repeat(np.arange(n_out), n_swap_feat), swap_feats.ravel())),
+                               shape=(n_out, dim))
+        o1 = seed[outlier_idx[:, 0]]
+        o2 = seed[outlier_idx[:, 1]]
+        noise = o1 - o1.multiply(swap_mask) + o2.multiply(swap_mask)
+        return csr_matrix(noise)
 
     def inject_noise(self, seed, n_out, random_seed):
         '''
@@ -337,7 +303,11 @@ class FEAWAD():
     def fit(self, X_train, y_train, ratio=None):
         # network_depth = int(self.args.network_depth)
         self.utils.set_seed(self.seed)
-        rng = np.random.RandomState(self.seed)
+
+        # csr input (1) is trained on the sparse batches directly, without densifying the whole training set
+        self.data_format = 1 if issparse(X_train) else 0
+        if issparse(X_train):
+            X_train = X_train.tocsr()
 
         # index
         outlier_indices = np.where(y_train == 1)[0]
@@ -350,27 +320,27 @@ class FEAWAD():
         self.utils.set_seed(self.seed)
         AEmodel = self.deviation_network(self.input_shape, 2, None, 0)  # pretrain auto-encoder model
         print('autoencoder pre-training start....')
-        AEmodel_name = os.path.join(self.modelpath, 'pretrained_autoencoder_'+self.save_suffix+'.h5')
-        ae_checkpointer = ModelCheckpoint(AEmodel_name, monitor='loss', verbose=0, save_best_only=True, save_weights_only=True)
-        AEmodel.fit_generator(self.auto_encoder_batch_generator_sup(X_train, inlier_indices, self.args.batch_size, self.args.nb_batch, rng),
-                                         steps_per_epoch=self.args.nb_batch, epochs=100, callbacks=[ae_checkpointer])
+        AEmodel_name = BestWeights.unique_path(self.modelpath, 'pretrained_autoencoder_'+self.save_suffix) if self.save_weights else None
+        ae_checkpointer = BestWeights(monitor='loss', save_path=AEmodel_name)
+        AEmodel.fit(self.AE_batch_dataset(X_train, inlier_indices, self.args.batch_size),
+                    steps_per_epoch=self.args.nb_batch, epochs=100, callbacks=[ae_checkpointer])
 
 
         #end-to-end devnet model
         print('load pretrained autoencoder model....')
         self.utils.set_seed(self.seed)
-        self.dev_model = self.deviation_network(self.input_shape, 4, AEmodel_name, 0)
+        self.dev_model = self.deviation_network(self.input_shape, 4, ae_checkpointer.best_weights, 0)
         print('end-to-end training start....')
-        self.dev_model_name = os.path.join(self.modelpath, 'devnet_'+self.save_suffix+'.h5')
-        checkpointer = ModelCheckpoint(self.dev_model_name, monitor='loss', verbose=0,
-                                       save_best_only=True, save_weights_only=True)
-        self.dev_model.fit_generator(self.batch_generator_sup(X_train, outlier_indices, inlier_indices, self.args.batch_size, self.args.nb_batch, rng),
-                                      steps_per_epoch=self.args.nb_batch,
-                                      epochs=self.args.epochs,
-                                      callbacks=[checkpointer])
+        self.dev_model_name = BestWeights.unique_path(self.modelpath, 'devnet_'+self.save_suffix) if self.save_weights else None
+        checkpointer = BestWeights(monitor='loss', save_path=self.dev_model_name)
+        self.dev_model.fit(self.dev_batch_dataset(X_train, outlier_indices, inlier_indices, self.args.batch_size),
+                           steps_per_epoch=self.args.nb_batch,
+                           epochs=self.args.epochs,
+                           callbacks=[checkpointer])
+        self.best_weights = checkpointer.best_weights
 
         return self
 
     def predict_score(self, X):
-        score = self.load_model_weight_predict(self.dev_model_name, self.input_shape, 4, X)
+        score = self.load_model_weight_predict(self.best_weights, self.input_shape, 4, X)
         return score
\ No newline at end of file
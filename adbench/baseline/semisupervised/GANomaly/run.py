@@ -1,6 +1,5 @@
-from adbench.myutils import Utils
+from adbench.myutils import Utils, TensorBatches
 import torch
-from torch.utils.data import DataLoader, TensorDataset
 from torch import nn
 
 from adbench.baseline.semisupervised.GANomaly.model import generator
@@ -27,8 +26,8 @@ class GANomaly():
         X_train = X_train[y_train == 0]
         y_train = y_train[y_train == 0]
 
-        train_tensor = TensorDataset(torch.from_numpy(X_train).float(), torch.tensor(y_train).float())
-        train_loader = DataLoader(train_tensor, batch_size=self.batch_size, shuffle=False, drop_last=True)
+        train_loader = TensorBatches(torch.from_numpy(X_train).float(), torch.tensor(y_train).float(),
+                                     batch_size=self.batch_size, shuffle=False, drop_last=True)
 
         input_size = X_train.shape[1]
         if input_size < 8:
@@ -1,18 +1,16 @@
 import torch
 from torch.autograd import Variable
-from adbench.baseline.semisupervised.PReNet.utils import sampler_pairs
+from adbench.baseline.semisupervised.PReNet.utils import PairSampler
 
 def fit(X_train_tensor, y_train, model, optimizer, epochs, batch_num, batch_size,
-         s_a_a, s_a_u, s_u_u, device=None):
+         s_a_a, s_a_u, s_u_u, device=None, seed=0):
+    # the batch samples are generated on the fly
+    sampler = PairSampler(X_train_tensor, y_train, batch_num, batch_size,
+                          s_a_a=s_a_a, s_a_u=s_a_u, s_u_u=s_u_u, seed=seed)
     # epochs
     for epoch in range(epochs):
-        # generate the batch samples
-        X_train_loader, y_train_loader = sampler_pairs(X_train_tensor, y_train, epoch, batch_num, batch_size,
-                                                       s_a_a=s_a_a, s_a_u=s_a_u, s_u_u=s_u_u)
-        for i in range(len(X_train_loader)):
-            X_left, X_right = X_train_loader[i][0], X_train_loader[i][1]
-            y = y_train_loader[i]
-
+        sampler.set_epoch(epoch)
+        for X_left, X_right, y in sampler:
             #to device
             X_left = X_left.to(device); X_right = X_right.to(device); y = y.to(device)
             # to variable
@@ -22,4 +22,12 @@ class prenet(nn.Module):
         # generate score based on the concat feature
         score = self.reg(feature)
 
-        return score.squeeze()
\ No newline at end of file
+        return score.squeeze()
+
+    # the regression head is linear, i.e., reg([f(left), f(right)]) = w_left·f(left) + w_right·f(right) + b
+    # return the left and right terms of each row of X (without the bias), so that the pairs can be scored without the concatenation
+    def forward_split(self, X):
+        feature = self.feature(X)
+        w_left, w_right = self.reg.weight.view(2, -1)
+
+        return torch.stack((feature @ w_left, feature @ w_right), dim=1)
\ No newline at end of file
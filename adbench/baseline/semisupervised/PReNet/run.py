@@ -14,7 +14,7 @@ The default hyper-parameter is the same as in the original paper
 class PReNet():
     def __init__(self, seed:int, model_name='PReNet', epochs:int=50, batch_num:int=20, batch_size:int=512,
                 act_fun=nn.ReLU(), lr:float=1e-3, weight_decay:float=1e-2,
-                s_a_a=8, s_a_u=4, s_u_u=0):
+                s_a_a=8, s_a_u=4, s_u_u=0, score_batch_size:int=8192):
 
         self.seed = seed
         self.utils = Utils()
@@ -31,6 +31,7 @@ class PReNet():
         self.s_a_a = s_a_a
         self.s_a_u = s_a_u
         self.s_u_u = s_u_u
+        self.score_batch_size = score_batch_size # chunk size of the embedding in the inference
 
     def fit(self, X_train, y_train, ratio=None):
 
@@ -45,44 +46,54 @@ class PReNet():
         # training
         fit(X_train_tensor=self.X_train_tensor, y_train=y_train, model=self.model, optimizer=optimizer,
             epochs=self.epochs, batch_num=self.batch_num, batch_size=self.batch_size,
-            s_a_a=self.s_a_a, s_a_u=self.s_a_u, s_u_u=self.s_u_u, device=self.device)
+            s_a_a=self.s_a_a, s_a_u=self.s_a_u, s_u_u=self.s_u_u, device=self.device, seed=self.seed)
 
-        return self
-
-
-    def predict_score(self, X, num=30):
+        # cache the left / right terms of the training samples, which are the reference samples in the inference
         self.model = self.model.eval()
+        self.index_a = np.where(y_train == 1)[0]
+        self.index_u = np.where(y_train == 0)[0]
+        self.ref_left, self.ref_right = self.split_terms(X_train).T
 
-        if torch.is_tensor(X):
-            pass
-        else:
-            X = torch.from_numpy(X)
-
-        X = X.float()
-        X = X.to(self.device)
-
-        score = []
-        for i in range(X.size(0)):
-            index_a = np.random.choice(np.where(self.y_train==1)[0], num, replace=True) #postive sample in training set
-            index_u = np.random.choice(np.where(self.y_train==0)[0], num, replace=True) #negative sample in training set
+        return self
 
-            X_train_a_tensor = self.X_train_tensor[index_a]
-            X_train_u_tensor = self.X_train_tensor[index_u]
 
+    def split_terms(self, X):
+        # left and right terms (n, 2) of the linear pair head, X is embedded in chunks
+        def predict_fn(chunk):
             with torch.no_grad():
-                score_a_x = self.model(X_train_a_tensor, torch.cat(num * [X[i].view(1, -1)]))
-                score_x_u = self.model(torch.cat(num * [X[i].view(1, -1)]), X_train_u_tensor)
+                return self.model.forward_split(torch.from_numpy(chunk).to(self.device)).cpu().numpy()
+
+        return self.utils.predict_chunked(predict_fn, X, chunk_size=self.score_batch_size)
 
-            score_sub = torch.mean(score_a_x + score_x_u)
-            score_sub = score_sub.numpy()[()]
+    def predict_score(self, X, num=30, mode='sampled'):
+        '''
+        score(x) = mean_a[reg(a, x)] + mean_u[reg(x, u)] = mean_a[left(a)] + mean_u[right(u)] + left(x) + right(x) + 2b,
+        where the terms of the training samples are cached after fit and each row of X is embedded only once
 
-            # entire score
-            score.append(score_sub)
+        :param num: number of the sampled anomalies / unlabeled samples of each row
+        :param mode: 'sampled' draws num reference samples per row from the global numpy random state,
+            'expectation' uses all the anomalies and unlabeled samples in the training set, i.e., the exact expectation of the sampled score
+        '''
+        self.model = self.model.eval()
 
-        return np.array(score)
+        if torch.is_tensor(X):
+            X = X.cpu().numpy()
 
+        terms = self.split_terms(X)
+        bias = self.model.reg.bias.item()
+        score = terms.sum(axis=1) + 2 * bias
 
+        if mode == 'expectation':
+            score += self.ref_left[self.index_a].mean() + self.ref_right[self.index_u].mean()
 
+        elif mode == 'sampled':
+            # all the indices are drawn at once (num per row), and the reference terms are gathered at once
+            index_a = np.random.choice(self.index_a, (X.shape[0], num), replace=True) #postive sample in training set
+            index_u = np.random.choice(self.index_u, (X.shape[0], num), replace=True) #negative sample in training set
 
+            score += self.ref_left[index_a].mean(axis=1) + self.ref_right[index_u].mean(axis=1)
 
+        else:
+            raise ValueError(f'unknown mode {mode}')
 
+        return score
@@ -2,9 +2,7 @@ import numpy as np
 from tqdm import tqdm
 import torch
 
-from adbench.myutils import Utils
-
-utils = Utils()
+from adbench.myutils import RNGStream
 
 '''
 from the original paper, when implement stratified random sampling
@@ -12,66 +10,77 @@ batch / 2 is from the (u,u) pair, batch / 4 is from the (a,a) pair and batch / 2
 where u is the unlabeled data and a is the labeled anomalies
 '''
 
-def sampler_pairs(X_train_tensor, y_train, epoch, batch_num, batch_size, s_a_a, s_a_u, s_u_u):
+class PairSampler(torch.utils.data.IterableDataset):
     '''
-    X_train_tensor: the input X in the torch.tensor form
-    y_train: label in the numpy.array form
-
-    batch_num: generate how many batches in one epoch
-    batch_size: the batch size
+    Streaming (on-the-fly) pair sampler, the batches of one epoch are generated lazily.
+    The indices of a batch are drawn in one vectorized call from the random stream of the (epoch, batch),
+    and the left / right samples are gathered from X_train_tensor with one index_select.
     '''
-    data_loader_X = []
-    data_loader_y = []
-
-    index_a = np.where(y_train == 1)[0]
-    index_u = np.where(y_train == 0)[0]
-
-    for i in range(batch_num):  # i.e., drop_last = True
-        index = []
-
-        # 分别是(a,a); (a,u); (u,u)共6部分样本
-        for j in range(6):
-            # generate unique seed and set seed
-            seed = utils.unique(epoch, i)
-            seed = utils.unique(seed, j)
-            utils.set_seed(seed)
-
-            if j < 3:  # 其中batch size // 4与原论文中一致
-                index_sub = np.random.choice(index_a, batch_size // 4, replace=True)
-                index.append(list(index_sub))
+    def __init__(self, X_train_tensor, y_train, batch_num, batch_size, s_a_a, s_a_u, s_u_u, seed=0):
+        '''
+        X_train_tensor: the input X in the torch.tensor form
+        y_train: label in the numpy.array form
+
+        batch_num: generate how many batches in one epoch
+        batch_size: the batch size
+        seed: the model seed, from which the random stream of each (epoch, batch) is derived
+        '''
+        self.X_train_tensor = X_train_tensor
+        self.batch_num = batch_num
+        self.rng_stream = RNGStream(seed)
+        self.epoch = 0
+
+        index_a = np.where(y_train == 1)[0]
+        index_u = np.where(y_train == 0)[0]
+        self.pool = np.append(index_a, index_u)
+
+        # (a,a) batch / 4; (a,u) batch / 4; (u,u) batch / 2, the left part is followed by the right part
+        n_aa, n_au, n_uu = batch_size // 4, batch_size // 4, batch_size // 2
+        left = np.repeat([0, 0, 1], [n_aa, n_au, n_uu])
+        right = np.repeat([0, 1, 1], [n_aa, n_au, n_uu])
+        pair_type = np.append(left, right)  # 0: labeled anomalies, 1: unlabeled data
+
+        # each position is drawn uniformly (i.e., with replacement) from the anomalies or the unlabeled data
+        self.pool_size = np.where(pair_type == 0, len(index_a), len(index_u))
+        self.pool_offset = np.where(pair_type == 0, 0, len(index_a))
+        self.n_pairs = len(left)
+
+        self.y = torch.from_numpy(np.repeat([s_a_a, s_a_u, s_u_u], [n_aa, n_au, n_uu])).float()
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def __len__(self):
+        return self.batch_num
+
+    def batch(self, i):
+        # independent random stream of the current (epoch, batch), instead of reseeding the global state
+        rng = self.rng_stream.generator(self.epoch, i)
+        index = self.pool[self.pool_offset + rng.integers(0, self.pool_size)]
 
-            if j == 3:
-                index_sub = np.random.choice(index_u, batch_size // 4, replace=True)  # unlabel部分可以变为False
-                index.append(list(index_sub))
-
-            if j > 3:
-                index_sub = np.random.choice(index_u, batch_size // 2, replace=True)  # unlabel部分可以变为False
-                index.append(list(index_sub))
-
-        # index[0] + index[1] = (a,a), batch / 4
-        # index[2] + index[2] = (a,u), batch / 4
-        # index[4] + index[5] = (u,u), batch / 2
-        index_left = index[0] + index[2] + index[4]
-        index_right = index[1] + index[3] + index[5]
+        # shuffle
+        index_shuffle = rng.permutation(self.n_pairs)
+        index = np.append(index[:self.n_pairs][index_shuffle], index[self.n_pairs:][index_shuffle])
 
-        X_train_tensor_left = X_train_tensor[index_left]
-        X_train_tensor_right = X_train_tensor[index_right]
+        X = self.X_train_tensor.index_select(0, torch.from_numpy(index))
 
-        # generate label
-        y_train_new = np.append(np.repeat(s_a_a, batch_size // 4), np.repeat(s_a_u, batch_size // 4))
-        y_train_new = np.append(y_train_new, np.repeat(s_u_u, batch_size // 2))
-        y_train_new = torch.from_numpy(y_train_new).float()
+        return X[:self.n_pairs], X[self.n_pairs:], self.y[index_shuffle]
 
-        # shuffle
-        index_shuffle = np.arange(len(y_train_new))
-        index_shuffle = np.random.choice(index_shuffle, len(index_shuffle), replace=False)
+    def __iter__(self):
+        for i in range(self.batch_num):  # i.e., drop_last = True
+            yield self.batch(i)
 
-        X_train_tensor_left = X_train_tensor_left[index_shuffle]
-        X_train_tensor_right = X_train_tensor_right[index_shuffle]
-        y_train_new = y_train_new[index_shuffle]
+def sampler_pairs(X_train_tensor, y_train, epoch, batch_num, batch_size, s_a_a, s_a_u, s_u_u, seed=0):
+    '''
+    materialize all the batches of one epoch (see PairSampler)
+    '''
+    sampler = PairSampler(X_train_tensor, y_train, batch_num, batch_size, s_a_a, s_a_u, s_u_u, seed=seed)
+    sampler.set_epoch(epoch)
 
-        # save
-        data_loader_X.append([X_train_tensor_left, X_train_tensor_right])  # 注意left和right顺序
-        data_loader_y.append(y_train_new)
+    data_loader_X = []
+    data_loader_y = []
+    for X_left, X_right, y in sampler:
+        data_loader_X.append([X_left, X_right])  # 注意left和right顺序
+        data_loader_y.append(y)
 
-    return data_loader_X, data_loader_y
\ No newline at end of file
+    return data_loader_X, data_loader_y
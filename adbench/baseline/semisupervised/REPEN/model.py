@@ -5,13 +5,14 @@ import warnings;
 
 warnings.simplefilter("ignore")
 
-from sklearn.neighbors import KDTree
 from sklearn.utils.random import sample_without_replacement
 
 from keras import backend as K
 from keras.models import Model
 from keras.layers import Input, Dense, Layer
-from keras.callbacks import ModelCheckpoint
+from keras.callbacks import EarlyStopping
+import tensorflow as tf
+from adbench.myutils import Utils, BestWeights
 
 MAX_INT = np.iinfo(np.int32).max
 
@@ -82,44 +83,32 @@ class Trainer:
 
     def __init__(self, n_epochs=50, batch_size=256,
                  nb_batch=100, random_seed=42,
-                 path_model=None, save_suffix=None):
+                 path_model=None, save_suffix=None, save_weights=False,
+                 patience=20, min_delta=0.0):
         self.n_epochs = n_epochs
         self.batch_size = batch_size
         self.nb_batch = nb_batch
         self.rng = np.random.RandomState(random_seed)
         self.path_model = path_model
         self.save_suffix = save_suffix
+        self.save_weights = save_weights
+        self.patience = patience
+        self.min_delta = min_delta
 
-    def batch_generator(self, X, positive_weights,
-                        negative_weights, inlier_ids,
-                        outlier_ids):
-        """batch generator
+    def tripletBatchIndex(self, rng, positive_weights, negative_weights,
+                          inlier_ids, outlier_ids):
+        """indices of one triplet batch, the positives never collide with the examples (unless there is only one inlier)
         """
-        rng = np.random.RandomState(self.rng.randint(MAX_INT, size=1))
-        counter = 0
-        while 1:
-            X1, X2, X3 = self.tripletBatchGeneration(X, rng, positive_weights,
-                                                     negative_weights,
-                                                     inlier_ids, outlier_ids)
-            counter += 1
-            yield ([np.array(X1), np.array(X2), np.array(X3)], None)
-            if (counter > self.nb_batch):
-                counter = 0
-
-    def tripletBatchGeneration(self, X, rng,
-                               positive_weights, negative_weights,
-                               inlier_ids, outlier_ids):
-        """batch generation
-        """
-        # import pdb; pdb.set_trace()
-        examples = np.zeros([self.batch_size]).astype('int')
-        positives = np.zeros([self.batch_size]).astype('int')
-        negatives = np.zeros([self.batch_size]).astype('int')
-
-        examples = rng.choice(inlier_ids, self.batch_size, p=positive_weights)
-        positives = rng.choice(inlier_ids, self.batch_size)
+        n_inliers = len(inlier_ids)
+        examples = rng.choice(n_inliers, self.batch_size, p=positive_weights)
+        # a random non-zero shift draws the positive uniformly from the other inliers, i.e., the same distribution
+        # as redrawing until positive != example, without the redraw loops
+        if n_inliers > 1:
+            positives = (examples + rng.randint(1, n_inliers, size=self.batch_size)) % n_inliers
+        else:
+            # there is no other inlier, the single inlier is its own positive
+            positives = examples
         if (len(outlier_ids) == 2) and (type(outlier_ids) == list):
-            # import pdb; pdb.set_trace()
             neg_1 = rng.choice(outlier_ids[0], int(self.batch_size / 2),
                                p=negative_weights[0])
             neg_2 = rng.choice(outlier_ids[1], self.batch_size - int(self.batch_size / 2),
@@ -127,17 +116,36 @@ class Trainer:
             negatives = np.hstack([neg_1, neg_2])
         else:
             negatives = rng.choice(outlier_ids, self.batch_size, p=negative_weights)
-        inds_to_change = np.where(examples == positives)[0]
-        while len(inds_to_change) > 0:
-            for inds in inds_to_change:
-                while examples[inds] == positives[inds]:
-                    positives[inds] = rng.choice(len(inlier_ids), 1)
-            inds_to_change = np.where(examples == positives)[0]
-
-        examples = X[examples, :]
-        positives = X[positives, :]
-        negatives = X[negatives, :]
-        return examples, positives, negatives;
+
+        return inlier_ids[examples], inlier_ids[positives], negatives
+
+    def batch_dataset(self, X, positive_weights, negative_weights,
+                      inlier_ids, outlier_ids):
+        """tf.data pipeline of the triplet batches, the indices are drawn sequentially (seeded by self.rng),
+        while the rows are gathered in parallel and prefetched
+        """
+        rng = np.random.RandomState(self.rng.randint(MAX_INT, size=1))
+        dim = X.shape[1]
+
+        def index_generator():
+            while 1:
+                yield self.tripletBatchIndex(rng, positive_weights, negative_weights, inlier_ids, outlier_ids)
+
+        def gather(examples, positives, negatives):
+            return tuple(np.asarray(X[_, :], dtype=np.float32) for _ in [examples, positives, negatives])
+
+        def gather_batch(examples, positives, negatives):
+            triplet = tf.numpy_function(gather, [examples, positives, negatives], [tf.float32] * 3)
+            for _ in triplet:
+                _.set_shape((self.batch_size, dim))
+            # only the inputs are provided, the ranking loss is added by the tripletRankingLossLayer
+            return (tuple(triplet),)
+
+        spec = tf.TensorSpec(shape=(self.batch_size,), dtype=tf.int64)
+        dataset = tf.data.Dataset.from_generator(index_generator, output_signature=(spec, spec, spec))
+        dataset = dataset.map(gather_batch, num_parallel_calls=tf.data.AUTOTUNE).prefetch(tf.data.AUTOTUNE)
+
+        return dataset
 
     def train(self, network, mode, x_train,
               positive_weights, negative_weights,
@@ -145,7 +153,8 @@ class Trainer:
               verbose=True):
 
         network.compile_model(x_train.shape[1])
-        model_name = os.path.join(self.path_model, 'REPEN_'+self.save_suffix+'.h5')
+        # the best weights are kept in memory (and restored after training), only saved to disk if save_weights is True
+        model_name = BestWeights.unique_path(self.path_model, 'REPEN_'+self.save_suffix) if self.save_weights else None
 
         # try:
         #     model_name = self.path_model + mode + "_" + str(outlier_indices.shape[0]) + "_" + \
@@ -153,35 +162,43 @@ class Trainer:
         # except:
         #     model_name = self.path_model + mode + "_" + str(np.hstack(outlier_indices).shape[0]) + "_" + \
         #                  str(network.hidden_dim) + "_" + str(self.batch_size)
-        checkpointer = ModelCheckpoint(model_name, monitor='loss', verbose=0,
-                                       save_best_only=True,
-                                       save_weights_only=True)
-
-        network.model.fit_generator(self.batch_generator(x_train, positive_weights,
-                                                         negative_weights,
-                                                         inlier_indices,
-                                                         outlier_indices),
-                                    steps_per_epoch=self.nb_batch,
-                                    epochs=self.n_epochs,
-                                    shuffle=False,
-                                    callbacks=[checkpointer],
-                                    verbose=verbose)
+        checkpointer = BestWeights(monitor='loss', save_path=model_name)
+        callbacks = [checkpointer]
+        # stop the training when the ranking loss does not decrease (by more than min_delta) for patience epochs
+        if self.patience is not None:
+            callbacks.append(EarlyStopping(monitor='loss', patience=self.patience, min_delta=self.min_delta))
+
+        network.model.fit(self.batch_dataset(x_train, positive_weights,
+                                             negative_weights,
+                                             inlier_indices,
+                                             outlier_indices),
+                          steps_per_epoch=self.nb_batch,
+                          epochs=self.n_epochs,
+                          callbacks=callbacks,
+                          verbose=verbose)
         return network
 
 
 class repen:
     def __init__(self, n_epochs=50, batch_size=256, n_neighbors=2,
                  nb_batch=100, random_seed=42,
-                 path_model=None, save_suffix=None,
+                 path_model=None, save_suffix=None, save_weights=False,
                  mode="semi_supervised", known_outliers=10, hidden_dim=20,
-                 confidence_margin=1000.0, input_shape=30, output=None, runs=None):
+                 confidence_margin=1000.0, input_shape=30, output=None, runs=None, score_batch_size=8192,
+                 patience=20, min_delta=0.0):
 
         assert (mode in ["semi_supervised", "unsupervised", "supervised"])
         self.mode = mode
         self.n_neighbors = n_neighbors
         self.known_outliers = known_outliers
-        self.Trainer = Trainer(n_epochs, batch_size, nb_batch, random_seed, path_model, save_suffix)
+        self.Trainer = Trainer(n_epochs, batch_size, nb_batch, random_seed, path_model, save_suffix, save_weights,
+                               patience, min_delta)
         self.network = Repen_network(hidden_dim, confidence_margin)
+        self.utils = Utils()
+        self.score_batch_size = score_batch_size # chunk size of the representation inference
+        # LeSiNN: ensemble_size subsamples with subsample_size points each
+        self.ensemble_size = 50
+        self.subsample_size = 8
 
     def prepare_data(self, x_train, y_train=None):
 
@@ -207,7 +224,10 @@ class repen:
             if outlier_ids.shape[0] < self.known_outliers:
                 outlier_scores = self.lesinn(x_train, x_train)
                 ind_scores = np.argsort(outlier_scores.flatten())
-                ind_scores = [elt for elt in ind_scores if elt not in outlier_ids]
+                # boolean mask instead of the membership test of each index
+                is_outlier = np.zeros(len(x_train), dtype=bool)
+                is_outlier[outlier_ids] = True
+                ind_scores = ind_scores[~is_outlier[ind_scores]]
                 mn = self.known_outliers - outlier_ids.shape[0]
                 to_add_idx = ind_scores[-mn:]
 
@@ -221,7 +241,9 @@ class repen:
 
             # end if
 
-            inlier_ids = np.delete(np.arange(len(x_train)), np.hstack(outlier_ids), axis=0)
+            is_outlier = np.zeros(len(x_train), dtype=bool)
+            is_outlier[np.hstack(outlier_ids)] = True
+            inlier_ids = np.flatnonzero(~is_outlier)
             transforms = np.sum(outlier_scores[inlier_ids]) - outlier_scores[inlier_ids]
             total_weights_p = np.sum(transforms)
 
@@ -230,13 +252,14 @@ class repen:
 
         else:
             outlier_ids = np.where(y_train == 1)[0]
-            inlier_ids = np.delete(np.arange(len(x_train)),
-                                   outlier_ids, axis=0)
+            inlier_ids = np.flatnonzero(y_train != 1)
             if outlier_ids.shape[0] > self.known_outliers:
                 mn = outlier_ids.shape[0] - self.known_outliers
                 remove_idx = self.Trainer.rng.choice(outlier_ids, mn, replace=False)
 
-                outlier_ids = np.array([elt for elt in outlier_ids if elt not in remove_idx])  ## to optimize
+                is_removed = np.zeros(len(x_train), dtype=bool)
+                is_removed[remove_idx] = True
+                outlier_ids = outlier_ids[~is_removed[outlier_ids]]
 
             positive_weights = np.ones(inlier_ids.shape[0]) * (1 / inlier_ids.shape[0])
             negative_weights = np.ones(outlier_ids.shape[0]) * (1 / outlier_ids.shape[0])
@@ -247,37 +270,55 @@ class repen:
         self.negative_weights = negative_weights
 
     def lesinn(self, x_train, to_query):
-        ensemble_size = 50
-        subsample_size = 8
-        scores = np.zeros([to_query.shape[0], 1])
-        seeds = self.Trainer.rng.randint(MAX_INT, size=ensemble_size)
-        for i in range(0, ensemble_size):
-            rs = np.random.RandomState(seeds[i])
-            sid = sample_without_replacement(n_population=x_train.shape[0],
-                                             n_samples=subsample_size,
-                                             random_state=rs)
-            subsample = x_train[sid]
-            kdt = KDTree(subsample, metric='euclidean')
-            dists, indices = kdt.query(to_query, k=self.n_neighbors)
-            # import pdb; pdb.set_trace()
-            dists = np.mean(dists, axis=1)[:, np.newaxis]
-            scores += dists
-        scores = scores / ensemble_size
-        return scores;
+        anchors = self.lesinn_anchors(x_train)
+        return self.lesinn_score(anchors, to_query)
+
+    def lesinn_anchors(self, x_train):
+        return np.asarray(x_train[self.lesinn_anchor_index(x_train.shape[0])], dtype=np.float64)
+
+    def lesinn_anchor_index(self, n_samples):
+        seeds = self.Trainer.rng.randint(MAX_INT, size=self.ensemble_size)
+        # the same seeded subsamples as the original KDTree-based implementation, i.e., ensemble_size x subsample_size anchors
+        sid = np.stack([sample_without_replacement(n_population=n_samples,
+                                                   n_samples=self.subsample_size,
+                                                   random_state=np.random.RandomState(seeds[i]))
+                        for i in range(self.ensemble_size)])
+        return sid.ravel()
+
+    def lesinn_score(self, anchors, to_query):
+        '''
+        vectorized LeSiNN: one (n x ensemble_size*subsample_size) distance computation per chunk,
+        followed by the k nearest anchors within each subsample (grouped top-k)
+        '''
+        anchors_sq = np.sum(anchors ** 2, axis=1)
+        scores = np.empty([to_query.shape[0], 1])
+        for start in range(0, to_query.shape[0], self.score_batch_size):
+            query = np.asarray(to_query[start:start + self.score_batch_size], dtype=np.float64)
+            dists = np.sum(query ** 2, axis=1)[:, np.newaxis] + anchors_sq[np.newaxis, :] - 2 * query @ anchors.T
+            dists = np.sqrt(np.maximum(dists, 0)).reshape(len(query), self.ensemble_size, self.subsample_size)
+            # mean distance to the n_neighbors nearest anchors of each subsample, averaged over the ensemble
+            dists = np.partition(dists, self.n_neighbors - 1, axis=2)[:, :, :self.n_neighbors]
+            scores[start:start + len(query), 0] = dists.mean(axis=2).mean(axis=1)
+
+        return scores
 
     def fit(self, x_train, y_train=None, verbose=False):
 
-        self.x_train = x_train
         self.prepare_data(x_train, y_train)
         self.network = self.Trainer.train(self.network, self.mode, x_train,
                                           self.positive_weights, self.negative_weights,
                                           self.inlier_ids, self.outlier_ids,
                                           verbose=verbose)
 
+        # the training representation does not change after fit, so the representation model and
+        # the LeSiNN anchors are computed only once, where only the sampled anchor rows of x_train are embedded
+        self.representation = self.network.get_representation()
+        sid = self.lesinn_anchor_index(x_train.shape[0])
+        self.anchors = np.asarray(self.utils.predict_chunked(self.representation.predict_on_batch, x_train[sid],
+                                                             self.score_batch_size), dtype=np.float64)
+
     def decision_function(self, x_val):
 
-        representation = self.network.get_representation()
-        hidden_features_tr = representation.predict(self.x_train)
-        hidden_features_val = representation.predict(x_val)
-        scores = self.lesinn(hidden_features_tr, hidden_features_val)
-        return scores
\ No newline at end of file
+        hidden_features_val = self.utils.predict_chunked(self.representation.predict_on_batch, x_val, self.score_batch_size)
+        scores = self.lesinn_score(self.anchors, hidden_features_val)
+        return scores
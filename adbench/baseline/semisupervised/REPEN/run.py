@@ -6,7 +6,8 @@ import os
 # we change the training epochs to 1000 since we find that the default setting (epochs=30) cannot guarantee
 class REPEN():
     def __init__(self, seed, model_name='REPEN', save_suffix='test',
-                 mode:str='supervised', hidden_dim:int=20, batch_size:int=256, nb_batch:int=50, n_epochs:int=1000):
+                 mode:str='supervised', hidden_dim:int=20, batch_size:int=256, nb_batch:int=50, n_epochs:int=1000,
+                 save_weights:bool=False, score_batch_size:int=8192, patience:int=20, min_delta:float=0.0):
         self.utils = Utils()
         self.device = self.utils.get_device()  # get device
         self.seed = seed
@@ -25,6 +26,11 @@ class REPEN():
         self.n_epochs = n_epochs
 
         self.save_suffix = save_suffix
+        self.save_weights = save_weights
+        self.score_batch_size = score_batch_size
+        # early stopping on the plateau of the ranking loss (None means training for the fixed n_epochs)
+        self.patience = patience
+        self.min_delta = min_delta
         self.modelpath = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'model')
         if not os.path.exists(self.modelpath):
             os.makedirs(self.modelpath)
@@ -40,7 +46,8 @@ class REPEN():
         # model initialization
         self.model = repen(mode=self.mode, hidden_dim=self.hidden_dim, batch_size=self.batch_size, nb_batch=self.nb_batch,
                            n_epochs=self.n_epochs, known_outliers=1000000,
-                           path_model=self.modelpath, save_suffix=self.save_suffix)
+                           path_model=self.modelpath, save_suffix=self.save_suffix, save_weights=self.save_weights,
+                           score_batch_size=self.score_batch_size, patience=self.patience, min_delta=self.min_delta)
 
 
         # fitting
@@ -5,6 +5,7 @@ from sklearn.ensemble import RandomForestClassifier
 import lightgbm as lgb
 import xgboost as xgb
 from catboost import CatBoostClassifier
+from scipy.sparse import issparse
 
 from adbench.myutils import Utils
 
@@ -22,6 +23,14 @@ class supervised():
                            'LGB':lgb.LGBMClassifier,
                            'XGB':xgb.XGBClassifier,
                            'CatB':CatBoostClassifier}
+        # the models which could not be trained on the scipy.sparse (csr) input directly
+        self.dense_model_list = ['NB']
+
+    def check_sparse(self, X):
+        # the csr input is passed to the sparse-aware models (SVM, MLP, RF, LGB, XGB, CatB) untouched
+        if issparse(X):
+            return X.toarray() if self.model_name in self.dense_model_list else X.tocsr()
+        return X
 
     def fit(self, X_train, y_train):
         if self.model_name == 'NB':
@@ -32,10 +41,10 @@ class supervised():
             self.model = self.model_dict[self.model_name](random_state=self.seed)
 
         # fitting
-        self.model.fit(X_train, y_train)
+        self.model.fit(self.check_sparse(X_train), y_train)
 
         return self
 
     def predict_score(self, X):
-        score = self.model.predict_proba(X)[:, 1]
+        score = self.model.predict_proba(self.check_sparse(X))[:, 1]
         return score
\ No newline at end of file
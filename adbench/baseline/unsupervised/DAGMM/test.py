@@ -1,5 +1,6 @@
 import torch
-from torch.utils.data import DataLoader
+
+from adbench.myutils import TensorBatches
 
 from adbench.baseline.unsupervised.DAGMM.forward_step import ComputeLoss
 
@@ -81,10 +82,10 @@ def eval(model, data, device, n_gmm, batch_size):
     X_train = data['X_train']
     X_test = data['X_test']
 
-    dataloader_train = DataLoader(torch.from_numpy(X_train).float(),
-                                  batch_size=batch_size, shuffle=False, drop_last=True)
-    dataloader_test = DataLoader(torch.from_numpy(X_test).float(),
-                                 batch_size=batch_size, shuffle=False, drop_last=False)
+    dataloader_train = TensorBatches(torch.from_numpy(X_train).float(),
+                                     batch_size=batch_size, shuffle=False, drop_last=True)
+    dataloader_test = TensorBatches(torch.from_numpy(X_test).float(),
+                                    batch_size=batch_size, shuffle=False, drop_last=False)
 
     # evaluation mode
     model.eval()
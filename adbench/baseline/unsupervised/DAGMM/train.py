@@ -4,8 +4,7 @@ from torch import optim
 from adbench.baseline.unsupervised.DAGMM.model import DAGMM
 from adbench.baseline.unsupervised.DAGMM.forward_step import ComputeLoss
 from adbench.baseline.unsupervised.DAGMM.utils.utils import weights_init_normal
-
-from torch.utils.data import DataLoader
+from adbench.myutils import TensorBatches
 
 
 class TrainerDAGMM:
@@ -19,8 +18,8 @@ class TrainerDAGMM:
         self.input_size = X_train.shape[1]
 
         # dataloader
-        self.train_loader = DataLoader(torch.from_numpy(X_train).float(),
-                                       batch_size=self.args.batch_size, shuffle=False, drop_last=True)
+        self.train_loader = TensorBatches(torch.from_numpy(X_train).float(),
+                                          batch_size=self.args.batch_size, shuffle=False, drop_last=True)
 
     def train(self):
         """Training the DAGMM model"""
@@ -1,5 +1,8 @@
 from adbench.myutils import Utils
 import numpy as np
+from scipy.sparse import issparse
+from sklearn.ensemble import IsolationForest
+from sklearn.svm import OneClassSVM
 
 from pyod.models.iforest import IForest
 from pyod.models.ocsvm import OCSVM
@@ -16,6 +19,28 @@ from pyod.models.sod import SOD
 from pyod.models.deep_svdd import DeepSVDD
 
 
+class SparseDetector():
+    '''
+    The PyOD detectors only accept the dense input (check_array), while the underlying sklearn detectors of IForest and OCSVM
+    accept the scipy.sparse (csr) input directly. The same default hyper-parameters and the same score direction
+    (outliers are assigned with larger anomaly scores) as the PyOD detectors are used.
+    '''
+    def __init__(self, model_name, param=None):
+        if model_name == 'IForest':
+            self.detector_ = IsolationForest(n_estimators=100 if param is None else param)
+        elif model_name == 'OCSVM':
+            self.detector_ = OneClassSVM(kernel='rbf' if param is None else param, gamma='auto', nu=0.5)
+        else:
+            raise NotImplementedError(f'{model_name} does not support the sparse input!')
+
+    def fit(self, X, y=None):
+        self.detector_.fit(X)
+        return self
+
+    def decision_function(self, X):
+        return -self.detector_.decision_function(X)
+
+
 class PYOD():
     def __init__(self, seed, model_name, tune=False):
         '''
@@ -33,6 +58,13 @@ class PYOD():
                             'PCA':PCA, 'SOD':SOD, 'DeepSVDD': DeepSVDD}
 
         self.tune = tune
+        # the models trained on the scipy.sparse input directly, the other models use the densified input
+        self.sparse_model_list = ['IForest', 'OCSVM']
+
+    def check_sparse(self, X):
+        if issparse(X):
+            return X.tocsr() if self.model_name in self.sparse_model_list else X.toarray()
+        return X
 
     def grid_hp(self, model_name):
         '''
@@ -84,7 +116,10 @@ class PYOD():
             metric_list = []
             for param in param_grid:
                 try:
-                    if self.model_name == 'IForest':
+                    if issparse(X_train):
+                        model = SparseDetector(self.model_name, param).fit(X_train)
+
+                    elif self.model_name == 'IForest':
                         model = self.model_dict[self.model_name](n_estimators=param).fit(X_train)
 
                     elif self.model_name == 'OCSVM':
@@ -153,6 +188,9 @@ class PYOD():
             X_train = X_train[idx_n]
             y_train = y_train[idx_n]
 
+        # the csr input is kept for the sparse-aware models
+        X_train = self.check_sparse(X_train)
+
         # selecting the best hyper-parameters of unsupervised model for fair comparison (if labeled anomalies is available)
         if sum(y_train) > 0 and self.tune:
             assert ratio is not None
@@ -166,7 +204,10 @@ class PYOD():
         self.utils.set_seed(self.seed)
 
         # fit best on the best param
-        if best_param is not None:
+        if issparse(X_train):
+            self.model = SparseDetector(self.model_name, best_param).fit(X_train)
+
+        elif best_param is not None:
             if self.model_name == 'IForest':
                 self.model = self.model_dict[self.model_name](n_estimators=best_param).fit(X_train)
 
@@ -211,5 +252,5 @@ class PYOD():
 
     # from pyod: for consistency, outliers are assigned with larger anomaly scores
     def predict_score(self, X):
-        score = self.model.decision_function(X)
+        score = self.model.decision_function(self.check_sparse(X))
         return score
\ No newline at end of file
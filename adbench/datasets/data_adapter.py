@@ -0,0 +1,224 @@
+import numpy as np
+import pandas as pd
+import os
+import json
+import hashlib
+import shutil
+
+# Cached datasets are stored as one folder per dataset:
+#   <cache_dir>/<name>/X.npy, y.npy (loaded with mmap_mode='r') and manifest.json (schema + statistics)
+class DataAdapter():
+    def __init__(self, cache_dir:str=None, dtype=None):
+        '''
+        :param cache_dir: folder of the converted datasets, default is datasets/Custom (next to the Classical folder)
+        :param dtype: dtype of the cached feature matrix X, default is float64 for the tables,
+        while the floating-point X of an .npz file keeps its own dtype (e.g., the float32 embeddings)
+        '''
+        if cache_dir is None:
+            cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Custom')
+        self.cache_dir = cache_dir
+        self.dtype = None if dtype is None else np.dtype(dtype)
+
+        self.format_dict = {'.parquet': 'parquet', '.pq': 'parquet',
+                            '.arrow': 'arrow', '.feather': 'arrow', '.ipc': 'arrow',
+                            '.csv': 'csv'}
+
+    def dataset_list(self):
+        # only the folders with a complete manifest are considered as registered datasets
+        if not os.path.exists(self.cache_dir):
+            return []
+
+        return sorted([_ for _ in os.listdir(self.cache_dir)
+                       if os.path.isfile(os.path.join(self.cache_dir, _, 'manifest.json'))])
+
+    def fingerprint(self, path):
+        stat = os.stat(path)
+        return hashlib.md5(f'{os.path.abspath(path)}_{stat.st_size}_{stat.st_mtime_ns}'.encode()).hexdigest()
+
+    def read_table(self, path, format):
+        '''
+        read the table as a pyarrow.Table (parquet / arrow) or a pandas.DataFrame (csv without pyarrow)
+        '''
+        if format in ['parquet', 'arrow']:
+            try:
+                import pyarrow
+            except ImportError:
+                raise ImportError(f'Reading {format} files requires pyarrow, please install it by "pip install pyarrow"')
+
+            if format == 'parquet':
+                import pyarrow.parquet as pq
+                return pq.read_table(path)
+            else:
+                import pyarrow.feather as feather
+                return feather.read_table(path)
+
+        elif format == 'csv':
+            try:
+                import pyarrow.csv as pcsv
+                return pcsv.read_csv(path)
+            except ImportError:
+                return pd.read_csv(path)
+
+        else:
+            raise NotImplementedError(f'Unsupported format: {format}')
+
+    def table_to_numpy(self, table, label_col, feature_cols=None):
+        '''
+        convert the table column by column into a preallocated array, without going through Python lists
+        '''
+        columns = list(table.column_names) if hasattr(table, 'column_names') else list(table.columns)
+        assert label_col in columns, f'The label column {label_col} is not found in the table!'
+
+        if feature_cols is None:
+            feature_cols = [_ for _ in columns if _ != label_col]
+        assert label_col not in feature_cols, 'The label column should not be used as a feature!'
+
+        def column(name):
+            col = table.column(name) if hasattr(table, 'column_names') else table[name]
+            return col.to_numpy()
+
+        dtype = np.dtype(np.float64) if self.dtype is None else self.dtype
+        X = np.empty((len(table), len(feature_cols)), dtype=dtype)
+        schema = []
+        for i, name in enumerate(feature_cols):
+            col = column(name)
+            schema.append({'name': name, 'dtype': str(col.dtype)})
+            try:
+                X[:, i] = col
+            except (TypeError, ValueError):
+                raise ValueError(f'The feature column {name} (dtype: {col.dtype}) can not be converted to {dtype}, '
+                                 f'only numeric columns are supported!')
+
+        y = column(label_col)
+        schema.append({'name': label_col, 'dtype': str(y.dtype), 'label': True})
+        y = y.astype(np.int64)
+        if not np.isin(y, [0, 1]).all():
+            raise ValueError(f'The label column {label_col} should only contain 0 (normal) and 1 (anomaly)!')
+
+        return X, y, feature_cols, schema
+
+    def ingest(self, path:str, label_col:str, name:str=None, format:str=None, feature_cols:list=None,
+               overwrite:bool=False):
+        '''
+        convert a Parquet / Arrow / CSV table to the cached binary form, the conversion is skipped
+        if the same source file has been converted before
+
+        :param path: path of the table
+        :param label_col: name of the label column (0: normal, 1: anomaly)
+        :param name: registered dataset name, default is the file name of the table
+        :param format: parquet, arrow or csv, inferred from the file extension if None
+        :param feature_cols: feature columns, default is all the columns except label_col
+        :param overwrite: whether to force the conversion even if the cache is up-to-date
+        :return: the registered dataset name
+        '''
+        if name is None:
+            name = os.path.splitext(os.path.basename(path))[0]
+        if format is None:
+            ext = os.path.splitext(path)[1].lower()
+            if ext not in self.format_dict:
+                raise NotImplementedError(f'Can not infer the format of {path}, please specify the format parameter!')
+            format = self.format_dict[ext]
+
+        fingerprint = self.fingerprint(path)
+        if not overwrite and os.path.isfile(os.path.join(self.cache_dir, name, 'manifest.json')):
+            manifest = self.load_manifest(name)
+            if manifest['fingerprint'] == fingerprint and manifest['label_col'] == label_col:
+                print(f'{name} is already cached. Skipping conversion...')
+                return name
+
+        print(f'Converting {path} to the cached dataset {name}...')
+        table = self.read_table(path, format)
+        X, y, feature_cols, schema = self.table_to_numpy(table, label_col, feature_cols)
+        del table
+
+        manifest = {'source': os.path.abspath(path),
+                    'format': format,
+                    'fingerprint': fingerprint,
+                    'label_col': label_col,
+                    'feature_cols': feature_cols,
+                    'schema': schema}
+        self.save(name, X, y, manifest)
+
+        return name
+
+    def npz_dtype(self, source_dtype):
+        # the floating-point features are cached as they are, unless a dtype is specified
+        if self.dtype is not None:
+            return self.dtype
+        source_dtype = np.dtype(source_dtype)
+        return source_dtype if np.issubdtype(source_dtype, np.floating) else np.dtype(np.float64)
+
+    def ingest_npz(self, path:str, name:str=None, overwrite:bool=False):
+        '''
+        convert an ADBench .npz file (with the X and y arrays) to the cached binary form,
+        since the arrays in a (compressed) .npz file can not be memory-mapped
+        '''
+        if name is None:
+            name = os.path.splitext(os.path.basename(path))[0]
+
+        fingerprint = self.fingerprint(path)
+        if not overwrite and os.path.isfile(os.path.join(self.cache_dir, name, 'manifest.json')):
+            manifest = self.load_manifest(name)
+            # the caches converted with a different dtype (e.g., float32 embeddings cast to float64) are converted again
+            if manifest['fingerprint'] == fingerprint and \
+                    manifest['stats']['dtype'] == str(self.npz_dtype(manifest['schema'][0]['dtype'])):
+                return name
+
+        print(f'Converting {path} to the cached dataset {name}...')
+        data = np.load(path, allow_pickle=True)
+        X_org, y_org = data['X'], data['y']
+        X = X_org.astype(self.npz_dtype(X_org.dtype), copy=False)
+        y = y_org.astype(np.int64, copy=False)
+
+        manifest = {'source': os.path.abspath(path),
+                    'format': 'npz',
+                    'fingerprint': fingerprint,
+                    'label_col': 'y',
+                    'feature_cols': None,
+                    'schema': [{'name': 'X', 'dtype': str(X_org.dtype), 'shape': list(X_org.shape)},
+                               {'name': 'y', 'dtype': str(y_org.dtype), 'label': True}]}
+        self.save(name, X, y, manifest)
+
+        return name
+
+    def save(self, name:str, X, y, manifest:dict):
+        save_path = os.path.join(self.cache_dir, name)
+
+        # the manifest is written at last, so that an interrupted conversion will not be registered
+        if os.path.exists(save_path):
+            shutil.rmtree(save_path)
+        os.makedirs(save_path)
+        np.save(os.path.join(save_path, 'X.npy'), X)
+        np.save(os.path.join(save_path, 'y.npy'), y)
+
+        manifest = dict({'name': name}, **manifest)
+        manifest['stats'] = self.statistics(X, y)
+        with open(os.path.join(save_path, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+    def statistics(self, X, y):
+        return {'Samples': int(X.shape[0]),
+                'Features': int(X.shape[1]),
+                'Anomalies': int(y.sum()),
+                'Anomalies Ratio(%)': round(float(y.sum() / len(y)) * 100, 2) if len(y) > 0 else 0.0,
+                'dtype': str(X.dtype),
+                'nan': int(np.isnan(X).sum()),
+                'min': np.nanmin(X, axis=0).tolist() if len(y) > 0 else [],
+                'max': np.nanmax(X, axis=0).tolist() if len(y) > 0 else [],
+                'mean': np.nanmean(X, axis=0).tolist() if len(y) > 0 else []}
+
+    def load_manifest(self, name:str):
+        with open(os.path.join(self.cache_dir, name, 'manifest.json'), 'r') as f:
+            return json.load(f)
+
+    def load(self, name:str, mmap_mode='r'):
+        '''
+        load the cached dataset, X and y are memory-mapped by default
+        '''
+        if name not in self.dataset_list():
+            raise NotImplementedError(f'The dataset {name} is not found in {self.cache_dir}!')
+
+        X = np.load(os.path.join(self.cache_dir, name, 'X.npy'), mmap_mode=mmap_mode)
+        y = np.load(os.path.join(self.cache_dir, name, 'y.npy'), mmap_mode=mmap_mode)
+
+        return {'X': X, 'y': y}
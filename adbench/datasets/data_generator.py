@@ -2,21 +2,28 @@ import numpy as np
 import pandas as pd
 import random
 import os
+import time
+import hashlib
 from math import ceil
+from scipy.sparse import csr_matrix, issparse
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import MinMaxScaler
 from itertools import combinations
 from sklearn.mixture import GaussianMixture
+from sklearn.decomposition import PCA, TruncatedSVD
+from sklearn.random_projection import SparseRandomProjection
+from sklearn.utils import murmurhash3_32
 
 from copulas.multivariate import VineCopula
 from copulas.univariate import GaussianKDE
 
 from adbench.myutils import Utils
+from adbench.datasets.data_adapter import DataAdapter
 
 # Chỉ hỗ trợ tạo dữ liệu phân loại nhị phân (nhãn 0 và 1)
 class DataGenerator():
     def __init__(self, seed:int=42, dataset:str=None, test_size:float=0.3,
-                 generate_duplicates=True, n_samples_threshold=1000):
+                 generate_duplicates=True, n_samples_threshold=1000, cache_dir:str=None):
         '''
         :param seed: 
         :param dataset: tên tập dữ liệu
@@ -24,6 +31,7 @@ class DataGenerator():
         :param generate_duplicates: Sinh duplicated samples khi kích thước mẫu quá nhỏ
         :param n_samples_threshold: ngưỡng để tạo duplicates ở tham số trên, nếu generate_duplicates là False thì 
             các tập dữ liệu có kích thước nhỏ hơn n_samples_threshold sẽ bị loại bỏ
+        :param cache_dir: folder of the datasets converted from Parquet/Arrow/CSV tables, default is datasets/Custom
         '''
 
         self.seed = seed
@@ -33,8 +41,20 @@ class DataGenerator():
         self.generate_duplicates = generate_duplicates
         self.n_samples_threshold = n_samples_threshold
 
+        # adapter for the Parquet/Arrow/CSV datasets
+        self.data_adapter = DataAdapter(cache_dir=cache_dir)
+        # adapters for the CV / NLP embedding datasets, whose .npz files are converted to memory-mappable arrays on first use
+        self.embedding_folders = ['CV_by_ResNet18', 'NLP_by_BERT']
+        self.embedding_adapters = {folder: DataAdapter(cache_dir=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                              'Cache', folder))
+                                   for folder in self.embedding_folders}
+
         # dataset list
-        self.dataset_list_classical = self.generate_dataset_list()
+        self.generate_dataset_list()
+
+        # fitted dimensionality reduction transforms, keyed by the training split and the reduction parameters
+        self.reduction_cache = {}
+        self.time_reduction = None
 
         # myutils function
         self.utils = Utils()
@@ -44,7 +64,47 @@ class DataGenerator():
         dataset_list_classical = [os.path.splitext(_)[0] for _ in
                                   os.listdir(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Classical'))
                                   if os.path.splitext(_)[1] == '.npz']
-        return dataset_list_classical
+        # CV and NLP datasets (downloaded by Utils.download_datasets), only the file names are indexed here
+        dataset_list_cv = self.index_folder('CV_by_ResNet18')
+        dataset_list_nlp = self.index_folder('NLP_by_BERT')
+        # datasets converted by the DataAdapter
+        dataset_list_custom = [_ for _ in self.data_adapter.dataset_list()
+                               if _ not in dataset_list_classical + dataset_list_cv + dataset_list_nlp]
+
+        self.dataset_list_classical = dataset_list_classical
+        self.dataset_list_cv = dataset_list_cv
+        self.dataset_list_nlp = dataset_list_nlp
+        self.dataset_list_custom = dataset_list_custom
+
+        return dataset_list_classical + dataset_list_cv + dataset_list_nlp + dataset_list_custom
+
+    def index_folder(self, folder:str):
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), folder)
+        if not os.path.exists(path):
+            return []
+
+        return sorted([os.path.splitext(_)[0] for _ in os.listdir(path) if os.path.splitext(_)[1] == '.npz'])
+
+    def load_embedding(self, folder:str, dataset:str):
+        '''
+        load the CV / NLP embedding dataset, the .npz file is converted only once and then memory-mapped
+        '''
+        adapter = self.embedding_adapters[folder]
+        adapter.ingest_npz(os.path.join(os.path.dirname(os.path.abspath(__file__)), folder, dataset + '.npz'),
+                           name=dataset)
+
+        return adapter.load(dataset)
+
+    def ingest(self, path:str, label_col:str, name:str=None, format:str=None, feature_cols:list=None,
+               overwrite:bool=False):
+        '''
+        convert a Parquet/Arrow/CSV table to the cached binary form and register it alongside the Classical datasets
+        '''
+        name = self.data_adapter.ingest(path=path, label_col=label_col, name=name, format=format,
+                                        feature_cols=feature_cols, overwrite=overwrite)
+        self.generate_dataset_list()
+
+        return name
 
 
     def generate_realistic_synthetic(self, X, y, realistic_synthetic_mode, alpha:int, percentage:float):
@@ -210,13 +270,77 @@ class DataGenerator():
 
         return X, y
 
+    def fit_maxabs(self, X_train):
+        '''
+        the same scaling as MaxAbsScaler for the csr input, computed with the scipy sparse operations directly,
+        since the sparse min / max helpers of sklearn 1.3.2 fail with the recent scipy (coo_matrix has no .A)
+        '''
+        max_abs = abs(X_train).max(axis=0).toarray().ravel()
+        scale = 1.0 / np.where(max_abs == 0, 1.0, max_abs)  # the all-zero columns are kept as they are
+        return lambda X: csr_matrix(X.multiply(scale[np.newaxis, :]))
+
+    '''
+    Dimensionality reduction for the wide datasets, fitted on the training set only
+    1. srp: sparse random projection
+    2. pca: truncated PCA (randomized SVD)
+    3. hashing: feature hashing, each feature is added to a hashed bucket with a hashed sign
+    '''
+    def fit_reduction(self, X_train, reduction:str, n_components:int):
+        if reduction == 'srp':
+            transform = SparseRandomProjection(n_components=n_components, dense_output=True, random_state=self.seed).fit(X_train)
+            return transform.transform
+
+        elif reduction == 'pca' and issparse(X_train):
+            # PCA would center (densify) the sparse matrix, the truncated SVD is used instead
+            transform = TruncatedSVD(n_components=n_components, algorithm='randomized', random_state=self.seed).fit(X_train)
+            return transform.transform
+
+        elif reduction == 'pca':
+            transform = PCA(n_components=n_components, svd_solver='randomized', random_state=self.seed).fit(X_train)
+            return transform.transform
+
+        elif reduction == 'hashing':
+            dim = X_train.shape[1]
+            h = murmurhash3_32(np.arange(dim, dtype=np.int32), seed=self.seed)
+            buckets = np.abs(h) % n_components
+            signs = np.where(h >= 0, 1.0, -1.0)
+            projection = csr_matrix((signs, (np.arange(dim), buckets)), shape=(dim, n_components))
+            return lambda X: (X @ projection).toarray() if issparse(X) else np.asarray(X @ projection)
+
+        else:
+            raise NotImplementedError(f'Unsupported reduction: {reduction}')
+
+    def reduce_dimension(self, X_train, X_test, reduction:str, n_components:int):
+        '''
+        the fitted transform is cached for each training split, i.e., it is reused across the different la
+        '''
+        start_time = time.time()
+        if issparse(X_train):
+            md5 = hashlib.md5(X_train.data.tobytes() + X_train.indices.tobytes() + X_train.indptr.tobytes()).hexdigest()
+        else:
+            md5 = hashlib.md5(np.ascontiguousarray(X_train).data).hexdigest()
+        key = (md5, X_train.shape, reduction, n_components, self.seed)
+        if key not in self.reduction_cache:
+            self.reduction_cache[key] = self.fit_reduction(X_train, reduction, n_components)
+        transform = self.reduction_cache[key]
+
+        X_train = transform(X_train)
+        X_test = transform(X_test)
+        self.time_reduction = time.time() - start_time
+
+        return X_train, X_test
+
     def generator(self, X=None, y=None, minmax=True,
                   la=None, at_least_one_labeled=False,
                   realistic_synthetic_mode=None, alpha:int=5, percentage:float=0.1,
-                  noise_type=None, duplicate_times:int=2, contam_ratio=1.00, noise_ratio:float=0.05):
+                  noise_type=None, duplicate_times:int=2, contam_ratio=1.00, noise_ratio:float=0.05,
+                  reduction:str=None, n_components:int=50):
         '''
         la: labeled anomalies, có thể là tỉ lệ bất thường được gán nhãn hoặc số lượng bất thường được gán nhãn
         at_least_one_labeled: đảm bảo ít nhất một bất thường được gán nhãn trong tập train
+        reduction: srp, pca or hashing —— dimensionality reduction after scaling (only if the number of features is larger than n_components)
+        n_components: the number of features after the reduction
+        X: the customized dataset, could be a scipy.sparse matrix (returned as csr_matrix without densifying)
         '''
 
         # set seed for reproducible results
@@ -229,12 +353,24 @@ class DataGenerator():
         else:
             if self.dataset in self.dataset_list_classical:
                 data = np.load(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Classical', self.dataset + '.npz'), allow_pickle=True)
+            elif self.dataset in self.dataset_list_cv:
+                data = self.load_embedding('CV_by_ResNet18', self.dataset)
+            elif self.dataset in self.dataset_list_nlp:
+                data = self.load_embedding('NLP_by_BERT', self.dataset)
+            elif self.dataset in self.dataset_list_custom:
+                data = self.data_adapter.load(self.dataset)
             else:
                 raise NotImplementedError
 
             X = data['X']
             y = data['y']
 
+        # the sparse matrix is passed through as csr_matrix (without the dense materialization)
+        if issparse(X):
+            X = X.tocsr()
+            if realistic_synthetic_mode is not None or noise_type == 'irrelevant_features':
+                raise NotImplementedError(f'{realistic_synthetic_mode or noise_type} is not supported for the sparse input!')
+
         # Số labeled anomalies trong original data
         if isinstance(la, (float, np.floating)):
             if at_least_one_labeled:
@@ -327,9 +463,16 @@ class DataGenerator():
 
         # minmax scaling
         if minmax:
-            scaler = MinMaxScaler().fit(X_train)
-            X_train = scaler.transform(X_train)
-            X_test = scaler.transform(X_test)
+            # for the sparse input, the max-abs scaling keeps the sparsity (the same as minmax for the non-negative features)
+            transform = self.fit_maxabs(X_train) if issparse(X_train) else MinMaxScaler().fit(X_train).transform
+            X_train = transform(X_train)
+            X_test = transform(X_test)
+
+        # dimensionality reduction (its cost is recorded in self.time_reduction)
+        self.time_reduction = None
+        if reduction is not None and X_train.shape[1] > n_components:
+            X_train, X_test = self.reduce_dimension(X_train, X_test, reduction=reduction, n_components=n_components)
+            print(f'reducing the dimension by {reduction}: {X_test.shape[1]} features, time: {self.time_reduction:.3f}s')
 
         # idx of normal samples and unlabeled/labeled anomalies
         idx_normal = np.where(y_train == 0)[0]
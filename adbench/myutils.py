@@ -11,13 +11,114 @@ import json
 import time
 import wget
 import zipfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from scipy.sparse import issparse
+from keras.callbacks import Callback
 from sklearn.metrics import roc_auc_score, average_precision_score
 import matplotlib.pyplot as plt
-from scipy.stats import wilcoxon
+from adbench.other_utils.metric import MetricEngine
+from adbench.other_utils.stats import ResultStats
+
+class RNGStream():
+    '''
+    Random streams of one model based on numpy SeedSequence, used instead of Utils.set_seed in the hot loops.
+    generator(*key) returns an independent numpy Generator for each key (e.g., (epoch, batch)) derived from the model seed,
+    so the draws are reproducible without reseeding the global numpy / random / tensorflow / torch state,
+    and different models (threads) do not interfere with each other.
+    The keyed generators (spawn_key (0, *key)) and the spawned children (spawn_key (1, i)) are in separate namespaces,
+    so a spawned child never replays a keyed stream.
+    '''
+    def __init__(self, seed:int):
+        self.seed = int(seed)
+        self.seed_sequence = np.random.SeedSequence(self.seed, spawn_key=(1,))
+
+    def generator(self, *key):
+        return np.random.default_rng(np.random.SeedSequence(self.seed, spawn_key=(0,) + tuple(int(_) for _ in key)))
+
+    def spawn(self, n:int):
+        # independent child SeedSequences (picklable), e.g., for the spawned worker processes
+        return self.seed_sequence.spawn(n)
+
+class BestWeights(Callback):
+    '''
+    Keep the weights of the best epoch in memory, used instead of ModelCheckpoint(save_best_only=True)
+    which writes a .h5 file on every improving epoch. The best weights are restored at the end of the training,
+    and are only saved to disk (a unique path per run) if save_path is given.
+    '''
+    def __init__(self, monitor:str='loss', restore:bool=True, save_path:str=None):
+        super(BestWeights, self).__init__()
+        self.monitor = monitor
+        self.restore = restore
+        self.save_path = save_path
+
+        self.best = np.inf
+        self.best_weights = None
+
+    def on_train_begin(self, logs=None):
+        self.best = np.inf
+        self.best_weights = None
+
+    def on_epoch_end(self, epoch, logs=None):
+        current = (logs or {}).get(self.monitor)
+        if current is not None and current < self.best:
+            self.best = current
+            self.best_weights = self.model.get_weights()
+
+    def on_train_end(self, logs=None):
+        if self.best_weights is None:
+            self.best_weights = self.model.get_weights()
+        if self.restore:
+            self.model.set_weights(self.best_weights)
+        if self.save_path is not None:
+            self.model.save_weights(self.save_path)
+
+    @staticmethod
+    def unique_path(path:str, prefix:str):
+        # unique file name for each run, so that the parallel runs do not overwrite the weights of each other
+        return os.path.join(path, f'{prefix}_{os.getpid()}_{uuid.uuid4().hex[:8]}.weights.h5')
+
+class TensorBatches():
+    '''
+    In-memory batch iterator for the tabular tensors, used instead of DataLoader(TensorDataset(...)) by the torch baselines.
+    Each batch is a slice (or an index_select with a random permutation) of the whole tensors,
+    so there is no per-sample __getitem__ and collation in each epoch.
+    Iterating over a single tensor yields the batch tensor, otherwise a tuple of the batch tensors (e.g., X, y, semi-targets, index).
+    '''
+    def __init__(self, *tensors, batch_size:int=128, shuffle:bool=False, drop_last:bool=False, generator=None):
+        '''
+        :param tensors: tensors with the same first dimension
+        :param shuffle: a new random permutation (from the torch global random state or the generator) in each epoch
+        :param drop_last: drop the last incomplete batch
+        '''
+        assert len(tensors) > 0 and all(_.size(0) == tensors[0].size(0) for _ in tensors)
+        self.tensors = tensors
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.generator = generator
+
+    def __len__(self):
+        n = self.tensors[0].size(0)
+        return n // self.batch_size if self.drop_last else -(-n // self.batch_size)
+
+    def __iter__(self):
+        n = self.tensors[0].size(0)
+        end = n - n % self.batch_size if self.drop_last else n
+        perm = torch.randperm(n, generator=self.generator) if self.shuffle else None
+
+        for start in range(0, end, self.batch_size):
+            if perm is None:
+                batch = tuple(_[start:start + self.batch_size] for _ in self.tensors)
+            else:
+                index = perm[start:start + self.batch_size]
+                batch = tuple(_.index_select(0, index.to(_.device)) for _ in self.tensors)
+
+            yield batch[0] if len(batch) == 1 else batch
 
 class Utils():
     def __init__(self):
-        pass
+        self.result_stats = ResultStats()
 
     # remove randomness
     def set_seed(self, seed):
@@ -84,62 +185,112 @@ class Utils():
 
         print(des_dict)
 
-    # metric
-    def metric(self, y_true, y_score):
-        aucroc = roc_auc_score(y_true=y_true, y_score=y_score)
-        aucpr = average_precision_score(y_true=y_true, y_score=y_score, pos_label=1)
+    def predict_chunked(self, predict_fn, X, chunk_size:int=8192):
+        '''
+        bounded-memory inference for the Keras scorers, X (dense, memory-mapped or csr) is streamed in chunks,
+        the next chunk is prepared (sliced, densified and cast to float32) in a background thread
+        while the current chunk is scored, only the output is allocated for the whole X
 
-        return {'aucroc':aucroc, 'aucpr':aucpr}
+        :param predict_fn: e.g., model.predict_on_batch
+        '''
+        n = X.shape[0]
+        if n == 0:
+            return np.empty((0, 1))
+
+        def load(start):
+            chunk = X[start:start + chunk_size]
+            chunk = chunk.toarray() if issparse(chunk) else chunk
+            return np.asarray(chunk, dtype=np.float32)
+
+        output = None
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(load, 0)
+            for start in range(0, n, chunk_size):
+                chunk = future.result()
+                if start + chunk_size < n:
+                    future = executor.submit(load, start + chunk_size)
+
+                out = np.asarray(predict_fn(chunk))
+                if output is None:
+                    output = np.empty((n,) + out.shape[1:], dtype=out.dtype)
+                output[start:start + len(chunk)] = out
+
+        return output
 
-    # resampling function
-    def sampler(self, X_train, y_train, batch_size):
-        index_u = np.where(y_train == 0)[0]
-        index_a = np.where(y_train == 1)[0]
+    # metric
+    def metric(self, y_true, y_score, n_bootstrap:int=0, seed:int=42):
+        '''
+        :param n_bootstrap: if > 0, the bootstrap confidence intervals (aucroc_ci, aucpr_ci) are also returned
+        for multiple models, please use the MetricEngine with the score matrix (n_models, n_samples) directly
+        '''
+        engine = MetricEngine(n_bootstrap=n_bootstrap, seed=seed)
+        y_score = np.asarray(y_score).ravel()
 
-        n = 0
-        while len(index_u) >= batch_size:
-            self.set_seed(n)
-            index_u_batch = np.random.choice(index_u, batch_size // 2, replace=False)
-            index_u = np.setdiff1d(index_u, index_u_batch)
+        result = engine.metric(y_true=y_true, y_score=y_score)
+        metric = {'aucroc':result['aucroc'][0], 'aucpr':result['aucpr'][0]}
 
-            index_a_batch = np.random.choice(index_a, batch_size // 2, replace=True)
+        if n_bootstrap > 0:
+            result = engine.bootstrap(y_true=y_true, y_score=y_score)
+            metric['aucroc_ci'] = result['aucroc'][0]
+            metric['aucpr_ci'] = result['aucpr'][0]
 
-            # batch index
-            index_batch = np.append(index_u_batch, index_a_batch)
-            # shuffle
-            np.random.shuffle(index_batch)
+        return metric
 
-            if n == 0:
-                X_train_new = X_train[index_batch]
-                y_train_new = y_train[index_batch]
-            else:
-                X_train_new = np.append(X_train_new, X_train[index_batch], axis=0)
-                y_train_new = np.append(y_train_new, y_train[index_batch])
-            n += 1
+    # resampling function
+    def balanced_batch_index(self, y_train, batch_size, n_batches=None, replace=False, seed=None):
+        '''
+        draw the indices of all the balanced batches in one epoch at once, each batch contains
+        batch_size // 2 unlabeled samples and batch_size // 2 labeled anomalies (with replacement)
 
-        return X_train_new, y_train_new
+        :param n_batches: the number of batches, if None, it is determined by the number of the unlabeled samples
+        :param replace: whether to draw the unlabeled samples with replacement
+        :param seed: seed of the numpy Generator, if None, it is drawn from the global numpy random state
+        :return: array of shape (n_batches, batch_size // 2 * 2)
+        '''
+        if seed is None:
+            seed = np.random.randint(np.iinfo(np.int32).max)
+        rng = np.random.default_rng(seed)
 
-    def sampler_2(self, X_train, y_train, step, batch_size=512):
         index_u = np.where(y_train == 0)[0]
         index_a = np.where(y_train == 1)[0]
+        half = batch_size // 2
 
-        for i in range(step):
-            index_u_batch = np.random.choice(index_u, batch_size // 2, replace=True)
-            index_a_batch = np.random.choice(index_a, batch_size // 2, replace=True)
+        if replace:
+            assert n_batches is not None, 'n_batches should be provided when sampling with replacement!'
+            index_u_batch = rng.choice(index_u, (n_batches, half), replace=True)
+        else:
+            if n_batches is None:
+                # i.e., the batches are drawn until less than batch_size unlabeled samples are left
+                n_batches = (len(index_u) - batch_size) // half + 1 if len(index_u) >= batch_size else 0
+            assert n_batches * half <= len(index_u), 'Not enough unlabeled samples for sampling without replacement!'
+            index_u_batch = rng.permutation(index_u)[:n_batches * half].reshape(n_batches, half)
 
-            # batch index
-            index_batch = np.append(index_u_batch, index_a_batch)
-            # shuffle
-            np.random.shuffle(index_batch)
+        index_a_batch = rng.choice(index_a, (n_batches, half), replace=True)
 
-            if i == 0:
-                X_train_new = X_train[index_batch]
-                y_train_new = y_train[index_batch]
-            else:
-                X_train_new = np.append(X_train_new, X_train[index_batch], axis=0)
-                y_train_new = np.append(y_train_new, y_train[index_batch])
+        # shuffle the samples within each batch
+        index_batch = np.concatenate((index_u_batch, index_a_batch), axis=1)
+        index_batch = rng.permuted(index_batch, axis=1)
 
-        return X_train_new, y_train_new
+        return index_batch
+
+    def balanced_batch_sampler(self, X_train, y_train, batch_size, n_batches=None, replace=False, seed=None):
+        '''
+        generator of the balanced batches (X, y), the batches are gathered lazily
+        instead of materializing the whole resampled dataset
+        '''
+        index_batch = self.balanced_batch_index(y_train, batch_size, n_batches=n_batches, replace=replace, seed=seed)
+        for index in index_batch:
+            yield X_train[index], y_train[index]
+
+    # sampler and sampler_2 return the whole resampled epoch (the concatenated batches) as before,
+    # use balanced_batch_sampler to gather the batches lazily
+    def sampler(self, X_train, y_train, batch_size, seed=None):
+        index_batch = self.balanced_batch_index(y_train, batch_size, replace=False, seed=seed).ravel()
+        return X_train[index_batch], y_train[index_batch]
+
+    def sampler_2(self, X_train, y_train, step, batch_size=512, seed=None):
+        index_batch = self.balanced_batch_index(y_train, batch_size, n_batches=step, replace=True, seed=seed).ravel()
+        return X_train[index_batch], y_train[index_batch]
 
     # for PReNet
     def sampler_pairs(self, X_train_tensor, y_train, epoch, batch_num, batch_size, s_a_a, s_a_u, s_u_u):
@@ -279,14 +430,8 @@ class Utils():
         ave_metric = np.mean(result_show, axis=0).values
         std_metric = np.std(result_show, axis=0).values
 
-        # statistical test
-        wilcoxon_df = pd.DataFrame(data=None, index=result_show.columns, columns=result_show.columns)
-
-        for i in range(wilcoxon_df.shape[0]):
-            for j in range(wilcoxon_df.shape[1]):
-                if i != j:
-                    wilcoxon_df.iloc[i, j] = \
-                    wilcoxon(result_show.iloc[:, i] - result_show.iloc[:, j], alternative='greater')[1]
+        # statistical test (all the pairwise one-sided wilcoxon tests at once, cached per version of result_show)
+        wilcoxon_df = self.result_stats.compute(result_show, zero_method='wilcox', alternative='greater')['p_matrix']
 
         # average rank
         result_show.loc['Ave.rank'] = np.mean(result_show.rank(ascending=False, method='dense', axis=1), axis=0)
@@ -0,0 +1,137 @@
+import numpy as np
+
+class MetricEngine():
+    '''
+    Batched AUC-ROC / AUC-PR / precision@k for multiple models sharing one y_true.
+    Each score column is sorted only once, ties are handled in the same way as sklearn
+    (roc_auc_score and average_precision_score), i.e., tied scores form one threshold.
+    The bootstrap reuses the same sorted order and only reweights the samples, so no re-sorting is needed.
+    '''
+    def __init__(self, k:int=None, n_bootstrap:int=1000, alpha:float=0.05, seed:int=42, chunk_size:int=2**24):
+        '''
+        :param k: k of precision@k, default is the number of anomalies in y_true (i.e., R-precision)
+        :param n_bootstrap: number of the bootstrap resamples
+        :param alpha: 1 - alpha is the confidence level of the bootstrap intervals
+        :param seed: seed of the bootstrap resampling
+        :param chunk_size: maximum number of elements (n_bootstrap x n_samples) processed at once in the bootstrap
+        '''
+        self.k = k
+        self.n_bootstrap = n_bootstrap
+        self.alpha = alpha
+        self.seed = seed
+        self.chunk_size = chunk_size
+
+    def check_input(self, y_true, y_score):
+        y_true = np.asarray(y_true).ravel()
+        y_score = np.asarray(y_score, dtype=np.float64)
+        if y_score.ndim == 1:
+            y_score = y_score[np.newaxis, :]
+        # (n_models, n_samples)
+        assert y_score.shape[1] == len(y_true), 'y_score should be of shape (n_models, n_samples)!'
+        assert np.isin(y_true, [0, 1]).all(), 'y_true should only contain 0 and 1!'
+
+        return y_true.astype(np.float64), y_score
+
+    def sort(self, y_true, y_score):
+        '''
+        one descending sort per score column, return the sorted order and the index of the last sample
+        of each tied group (i.e., the position of the threshold that each sample belongs to)
+        '''
+        order = np.argsort(-y_score, axis=1, kind='mergesort')
+        score_sorted = np.take_along_axis(y_score, order, axis=1)
+
+        n = y_score.shape[1]
+        boundary = np.ones_like(score_sorted, dtype=bool)
+        boundary[:, :-1] = score_sorted[:, :-1] != score_sorted[:, 1:]
+        group_end = np.where(boundary, np.arange(n), n)
+        group_end = np.minimum.accumulate(group_end[:, ::-1], axis=1)[:, ::-1]
+
+        return order, group_end
+
+    def curve_metric(self, tps, fps, group_end):
+        '''
+        compute AUC-ROC and AUC-PR from the (weighted) cumulative true / false positives along the sorted order,
+        tps and fps: (..., n_samples)
+        '''
+        tps = np.take_along_axis(tps, np.broadcast_to(group_end, tps.shape), axis=-1)
+        fps = np.take_along_axis(fps, np.broadcast_to(group_end, fps.shape), axis=-1)
+        n_pos = tps[..., -1:]
+        n_neg = fps[..., -1:]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # roc curve with the (0, 0) starting point, the tied samples contribute zero width
+            tpr = np.concatenate((np.zeros_like(n_pos), tps), axis=-1) / n_pos
+            fpr = np.concatenate((np.zeros_like(n_neg), fps), axis=-1) / n_neg
+            aucroc = np.sum(np.diff(fpr, axis=-1) * (tpr[..., 1:] + tpr[..., :-1]) / 2, axis=-1)
+
+            # step-wise average precision (the same as sklearn)
+            precision = tps / (tps + fps)
+            precision = np.nan_to_num(precision, nan=0.0)
+            aucpr = np.sum(np.diff(tpr, axis=-1) * precision, axis=-1)
+
+        aucroc = np.where((n_pos[..., 0] > 0) & (n_neg[..., 0] > 0), aucroc, np.nan)
+        aucpr = np.where(n_pos[..., 0] > 0, aucpr, np.nan)
+
+        return aucroc, aucpr
+
+    def metric(self, y_true, y_score):
+        '''
+        :param y_true: ground-truth label of shape (n_samples,)
+        :param y_score: anomaly scores of shape (n_models, n_samples) or (n_samples,)
+        :return: dict of arrays (n_models,), the models with non-finite scores get nan
+        '''
+        y_true, y_score = self.check_input(y_true, y_score)
+        valid = np.isfinite(y_score).all(axis=1)
+        y_score = np.where(valid[:, np.newaxis], y_score, 0.0)
+
+        order, group_end = self.sort(y_true, y_score)
+        y_sorted = y_true[order]
+        tps = np.cumsum(y_sorted, axis=1)
+        fps = np.cumsum(1 - y_sorted, axis=1)
+        aucroc, aucpr = self.curve_metric(tps, fps, group_end)
+
+        k = int(y_true.sum()) if self.k is None else self.k
+        k = min(max(k, 1), len(y_true))
+        patk = tps[:, k - 1] / k
+
+        nan = np.full(len(valid), np.nan)
+        return {'aucroc': np.where(valid, aucroc, nan),
+                'aucpr': np.where(valid, aucpr, nan),
+                'patk': np.where(valid, patk, nan)}
+
+    def bootstrap(self, y_true, y_score):
+        '''
+        percentile bootstrap confidence intervals, each resample is represented by the sample counts (weights)
+        :return: dict of arrays (n_models, 2) with the lower and upper bounds
+        '''
+        y_true, y_score = self.check_input(y_true, y_score)
+        n_models, n = y_score.shape
+        valid = np.isfinite(y_score).all(axis=1)
+        y_score = np.where(valid[:, np.newaxis], y_score, 0.0)
+
+        order, group_end = self.sort(y_true, y_score)
+
+        rng = np.random.default_rng(self.seed)
+        aucroc = np.empty((n_models, self.n_bootstrap))
+        aucpr = np.empty((n_models, self.n_bootstrap))
+        step = max(self.chunk_size // n, 1)
+        for start in range(0, self.n_bootstrap, step):
+            # counts of each sample in each resample of the chunk (shared by all the models),
+            # drawn chunk by chunk so that the memory is bounded by chunk_size
+            weights = rng.multinomial(n, np.full(n, 1.0 / n), size=min(step, self.n_bootstrap - start)).astype(np.float64)
+            for i in range(n_models):
+                y_sorted = y_true[order[i]]
+                w = weights[:, order[i]]
+                tps = np.cumsum(w * y_sorted, axis=1)
+                fps = np.cumsum(w * (1 - y_sorted), axis=1)
+                aucroc[i, start:start + step], aucpr[i, start:start + step] = self.curve_metric(tps, fps, group_end[i])
+
+        q = [100 * self.alpha / 2, 100 * (1 - self.alpha / 2)]
+        result = {}
+        for name, value in zip(['aucroc', 'aucpr'], [aucroc, aucpr]):
+            ci = np.full((n_models, 2), np.nan)
+            if valid.any():
+                ci[valid] = np.nanpercentile(value[valid], q, axis=1).T
+            result[name] = ci
+
+        return result
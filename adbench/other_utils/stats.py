@@ -0,0 +1,255 @@
+import numpy as np
+import pandas as pd
+import hashlib
+import os
+from itertools import product
+from scipy.stats import rankdata, chi2, norm
+
+class ResultStats():
+    '''
+    Vectorized statistics over the result tables (datasets x models):
+    average ranks, Friedman test, all pairwise Wilcoxon signed-rank tests and the Holm correction.
+    The pairwise Wilcoxon tests follow the method='auto' rules of scipy.stats.wilcoxon for each pair
+    (exact distribution without ties / zeros, exhaustive sign-flip test for small samples with ties,
+    otherwise the normal approximation), so the p-values are the same as calling scipy pair by pair.
+    The results are cached per version of the result store (a csv file or a DataFrame).
+    '''
+    def __init__(self, chunk_size:int=2**22):
+        '''
+        :param chunk_size: maximum number of elements (n_pairs x n_datasets x ...) processed at once
+        '''
+        self.chunk_size = chunk_size
+        self.cache = {}
+        self.wilcoxon_distr = {}
+
+    def version(self, result):
+        # the version of a result store: modification time of a csv file or the hash of a DataFrame
+        if isinstance(result, str):
+            stat = os.stat(result)
+            return f'{os.path.abspath(result)}_{stat.st_size}_{stat.st_mtime_ns}'
+        elif isinstance(result, pd.DataFrame):
+            return hashlib.md5(pd.util.hash_pandas_object(result, index=True).values.tobytes()
+                               + str(list(result.columns)).encode()).hexdigest()
+        else:
+            return hashlib.md5(np.ascontiguousarray(result).tobytes() + str(np.shape(result)).encode()).hexdigest()
+
+    def pivot(self, df_perf, dataset_col='dataset_name', model_col='classifier_name', value_col='accuracy'):
+        '''
+        pivot the long result DataFrame once into a dense (datasets x models) DataFrame,
+        only the models evaluated on the maximum number of datasets are kept (see wilcoxon_holm)
+        '''
+        df = df_perf.pivot_table(index=dataset_col, columns=model_col, values=value_col, aggfunc='first')
+        counts = df.notna().sum(axis=0)
+        df = df.loc[:, counts == counts.max()]
+        df = df.dropna(axis=0)
+
+        return df
+
+    def average_rank(self, A, method='average', ascending=False):
+        '''
+        average rank of each model over datasets, rank 1 is the best (the largest metric by default)
+        '''
+        A = np.asarray(A, dtype=np.float64)
+        ranks = rankdata(A if ascending else -A, method=method, axis=1)
+        return ranks.mean(axis=0)
+
+    def friedman(self, A):
+        '''
+        Friedman chi-square test (the same as scipy.stats.friedmanchisquare with the columns of A)
+        '''
+        A = np.asarray(A, dtype=np.float64)
+        n, k = A.shape
+        ranks = rankdata(A, method='average', axis=1)
+        t = self.tie_size(A)
+        ties = np.sum(t ** 2 - 1)
+        c = 1 - ties / (k * (k * k - 1) * n)
+        ssbn = np.sum(ranks.sum(axis=0) ** 2)
+        chisq = (12.0 / (k * n * (k + 1)) * ssbn - 3 * n * (k + 1)) / c
+
+        return chisq, chi2.sf(chisq, k - 1)
+
+    def tie_size(self, X):
+        # size of the tied group of each element (along the last axis), e.g., sum(t**2 - 1) = sum over groups (t**3 - t)
+        return rankdata(X, method='max', axis=-1) - rankdata(X, method='min', axis=-1) + 1
+
+    def exact_distr(self, n:int):
+        # null distribution (pmf) of the Wilcoxon signed-rank statistic without ties
+        if n not in self.wilcoxon_distr:
+            counts = np.zeros(n * (n + 1) // 2 + 1)
+            counts[0] = 1
+            for i in range(1, n + 1):
+                counts[i:] = counts[i:] + counts[:-i].copy()
+            self.wilcoxon_distr[n] = counts / 2 ** n
+        return self.wilcoxon_distr[n]
+
+    def wilcoxon_statistic(self, D, zero_method):
+        '''
+        :param D: differences of shape (n_pairs, n_datasets)
+        :return: r_plus, r_minus, z, count, has_ties, has_zeros, ranks, valid (non-dropped elements) of each pair
+        '''
+        zeros = D == 0
+        absd = np.abs(D)
+        if zero_method == 'wilcox':
+            # the zeros are dropped, ranking them as inf keeps the ranks of the others unchanged
+            absd = np.where(zeros, np.inf, absd)
+            valid = ~zeros
+        elif zero_method == 'pratt':
+            valid = np.ones_like(zeros)
+        else:
+            raise NotImplementedError(f'Unsupported zero_method: {zero_method}')
+
+        ranks = rankdata(absd, method='average', axis=1)
+        r_plus = np.sum((D > 0) * ranks, axis=1)
+        r_minus = np.sum((D < 0) * ranks, axis=1)
+
+        count = valid.sum(axis=1).astype(np.float64)
+        mn = count * (count + 1.) * 0.25
+        se = count * (count + 1.) * (2. * count + 1.)
+
+        # the dropped zeros are not tied with each other
+        t = np.where(valid, self.tie_size(absd), 1)
+        has_ties = np.any(t > 1, axis=1)
+        if zero_method == 'pratt':
+            n_zero = zeros.sum(axis=1).astype(np.float64)
+            mn -= n_zero * (n_zero + 1.) * 0.25
+            se -= n_zero * (n_zero + 1.) * (2. * n_zero + 1.)
+            # zeros are not included in the tie correction
+            t = np.where(zeros, 1, t)
+            has_ties = np.any(t > 1, axis=1)
+
+        tie_correct = np.sum(t ** 2 - 1., axis=1)
+        se = np.sqrt((se - tie_correct / 2) / 24)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            z = (r_plus - mn) / se
+
+        return r_plus, r_minus, z, count, has_ties, zeros.any(axis=1), ranks, valid
+
+    def wilcoxon_pvalue(self, D, zero_method='wilcox', alternative='two-sided'):
+        '''
+        p-values of the Wilcoxon signed-rank test for each row of D (n_pairs, n_datasets)
+        '''
+        D = np.asarray(D, dtype=np.float64)
+        n_pairs, n = D.shape
+        r_plus, r_minus, z, count, has_ties, has_zeros, ranks, valid = self.wilcoxon_statistic(D, zero_method)
+        p = np.full(n_pairs, np.nan)
+
+        # method='auto' of scipy
+        if n > 50:
+            asymptotic = np.ones(n_pairs, dtype=bool)
+            exact = permutation = np.zeros(n_pairs, dtype=bool)
+        else:
+            exact = ~(has_ties | has_zeros)
+            permutation = ~exact & (n <= 13)
+            asymptotic = ~exact & ~permutation
+
+        if asymptotic.any():
+            p[asymptotic] = self.pvalue(norm.sf(z[asymptotic]), norm.cdf(z[asymptotic]), alternative)
+
+        if exact.any():
+            distr = self.exact_distr(n)
+            sf = np.cumsum(distr[::-1])[::-1]
+            cdf = np.cumsum(distr)
+            p[exact] = self.pvalue(sf[np.floor(r_plus[exact]).astype(int)],
+                                   cdf[np.ceil(r_plus[exact]).astype(int)], alternative)
+
+        if permutation.any():
+            # exhaustive sign-flip test: the statistic under each of the 2**n sign patterns
+            signs = np.array(list(product([0., 1.], repeat=n)))  # (2**n, n), 1 means positive
+            idx = np.where(permutation)[0]
+            step = max(self.chunk_size // (len(signs) * n), 1)
+            for start in range(0, len(idx), step):
+                i = idx[start:start + step]
+                r = ranks[i] * (valid[i] & (D[i] != 0))
+                null = r @ signs.T
+                gamma = np.abs(1e-14 * r_plus[i])[:, np.newaxis]
+                p_greater = np.mean(null >= r_plus[i][:, np.newaxis] - gamma, axis=1)
+                p_less = np.mean(null <= r_plus[i][:, np.newaxis] + gamma, axis=1)
+                p[i] = self.pvalue(p_greater, p_less, alternative)
+
+        return p, r_plus, r_minus
+
+    def pvalue(self, p_greater, p_less, alternative):
+        if alternative == 'greater':
+            return p_greater
+        elif alternative == 'less':
+            return p_less
+        elif alternative == 'two-sided':
+            return np.clip(2 * np.minimum(p_greater, p_less), 0, 1)
+        else:
+            raise NotImplementedError(f'Unsupported alternative: {alternative}')
+
+    def wilcoxon(self, A, zero_method='wilcox', alternative='two-sided'):
+        '''
+        all pairwise Wilcoxon signed-rank tests between the columns (models) of A
+        :return: p-value matrix (n_models, n_models), where p[i, j] tests A[:, i] - A[:, j], the diagonal is nan
+        '''
+        A = np.asarray(A, dtype=np.float64)
+        m = A.shape[1]
+        i, j = np.triu_indices(m, k=1)
+
+        p_matrix = np.full((m, m), np.nan)
+        step = max(self.chunk_size // max(A.shape[0], 1) // 8, 1)
+        for start in range(0, len(i), step):
+            ii, jj = i[start:start + step], j[start:start + step]
+            D = (A[:, ii] - A[:, jj]).T
+            if alternative == 'two-sided':
+                p, _, _ = self.wilcoxon_pvalue(D, zero_method=zero_method, alternative='two-sided')
+                p_matrix[ii, jj] = p
+                p_matrix[jj, ii] = p
+            else:
+                # the opposite direction of (j, i) is the same test with the reversed alternative
+                reverse = 'less' if alternative == 'greater' else 'greater'
+                p_matrix[ii, jj], _, _ = self.wilcoxon_pvalue(D, zero_method=zero_method, alternative=alternative)
+                p_matrix[jj, ii], _, _ = self.wilcoxon_pvalue(D, zero_method=zero_method, alternative=reverse)
+
+        return p_matrix
+
+    def holm(self, p_values, alpha=0.05):
+        '''
+        Holm step-down correction, return whether each hypothesis is rejected
+        '''
+        p_values = np.asarray(p_values, dtype=np.float64)
+        k = len(p_values)
+        order = np.argsort(p_values, kind='mergesort')
+        passed = p_values[order] <= alpha / (k - np.arange(k))
+        reject = np.zeros(k, dtype=bool)
+        reject[order] = np.cumprod(passed).astype(bool)
+
+        return reject
+
+    def compute(self, result, alpha=0.05, zero_method='pratt', alternative='two-sided', rank_method='average',
+                dataset_col='dataset_name', model_col='classifier_name', value_col='accuracy'):
+        '''
+        :param result: a wide DataFrame (datasets x models), a long DataFrame with dataset_col / model_col / value_col,
+            or the path of a saved csv result (wide, with the first column as index)
+        :return: dict of the average ranks, Friedman p-value, pairwise p-values and Holm rejections
+        '''
+        key = (self.version(result), alpha, zero_method, alternative, rank_method, dataset_col, model_col, value_col)
+        if key in self.cache:
+            return self.cache[key]
+
+        if isinstance(result, str):
+            result = pd.read_csv(result, index_col=0)
+        if isinstance(result, pd.DataFrame) and {dataset_col, model_col, value_col}.issubset(result.columns):
+            result = self.pivot(result, dataset_col=dataset_col, model_col=model_col, value_col=value_col)
+        result = pd.DataFrame(result).astype(np.float64)
+
+        A = result.values
+        models = np.array(result.columns)
+        p_matrix = self.wilcoxon(A, zero_method=zero_method, alternative=alternative)
+
+        # the pairwise hypothesis (i < j) and the Holm correction
+        i, j = np.triu_indices(len(models), k=1)
+        p_pairs = p_matrix[i, j]
+        reject = self.holm(p_pairs, alpha=alpha)
+
+        stats = {'models': models,
+                 'average_rank': pd.Series(self.average_rank(A, method=rank_method), index=models),
+                 'friedman_p_value': self.friedman(A)[1] if len(models) > 2 else np.nan,
+                 'p_matrix': pd.DataFrame(p_matrix, index=models, columns=models),
+                 'pairs': pd.DataFrame({'model_1': models[i], 'model_2': models[j],
+                                        'p_value': p_pairs, 'reject': reject}),
+                 'n_datasets': A.shape[0]}
+        self.cache[key] = stats
+
+        return stats
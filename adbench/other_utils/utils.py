@@ -17,9 +17,10 @@ matplotlib.rcParams['font.sans-serif'] = 'Arial'
 
 import operator
 import math
-from scipy.stats import wilcoxon
-from scipy.stats import friedmanchisquare
 import networkx
+from adbench.other_utils.stats import ResultStats
+
+result_stats = ResultStats()
 
 # inspired from orange3 https://docs.orange.biolab.si/3/data-mining-library/reference/evaluation.cd.html
 def graph_ranks(avranks, names, p_values, cd=None, cdmethod=None, lowv=None, highv=None,
@@ -332,68 +333,31 @@ def wilcoxon_holm(alpha=0.05, df_perf=None):
     to reject the null's hypothesis
     """
     print(pd.unique(df_perf['classifier_name']))
-    # count the number of tested datasets per classifier
-    df_counts = pd.DataFrame({'count': df_perf.groupby(
-        ['classifier_name']).size()}).reset_index()
-    # get the maximum number of tested datasets
-    max_nb_datasets = df_counts['count'].max()
-    # get the list of classifiers who have been tested on nb_max_datasets
-    classifiers = list(df_counts.loc[df_counts['count'] == max_nb_datasets]
-                       ['classifier_name'])
+    # pivot once into (datasets x classifiers), only the classifiers tested on the max number of datasets are kept
+    # all the pairwise tests are computed together and cached per version of df_perf
+    stats = result_stats.compute(df_perf, alpha=alpha, zero_method='pratt', alternative='two-sided')
+    max_nb_datasets = stats['n_datasets']
     # test the null hypothesis using friedman before doing a post-hoc analysis
-    friedman_p_value = friedmanchisquare(*(
-        np.array(df_perf.loc[df_perf['classifier_name'] == c]['accuracy'])
-        for c in classifiers))[1]
-    if friedman_p_value >= alpha:
-        # then the null hypothesis over the entire classifiers cannot be rejected
+    friedman_p_value = stats['friedman_p_value']
+    if len(stats['models']) < 3:
+        # the friedman test needs at least 3 classifiers, the single pairwise wilcoxon test is used directly
+        friedman_reject = True
+    else:
+        # a nan p-value (e.g., all the classifiers are tied on every dataset) is not a rejection
+        friedman_reject = bool(friedman_p_value < alpha)
+    if not friedman_reject:
+        # then the null hypothesis over the entire classifiers cannot be rejected,
+        # none of the pairwise differences is considered as significant
         print('the null hypothesis over the entire classifiers cannot be rejected')
-        exit()
-    # get the number of classifiers
-    m = len(classifiers)
-    # init array that contains the p-values calculated by the Wilcoxon signed rank test
-    p_values = []
-    # loop through the algorithms to compare pairwise
-    for i in range(m - 1):
-        # get the name of classifier one
-        classifier_1 = classifiers[i]
-        # get the performance of classifier one
-        perf_1 = np.array(df_perf.loc[df_perf['classifier_name'] == classifier_1]['accuracy']
-                          , dtype=np.float64)
-        for j in range(i + 1, m):
-            # get the name of the second classifier
-            classifier_2 = classifiers[j]
-            # get the performance of classifier one
-            perf_2 = np.array(df_perf.loc[df_perf['classifier_name'] == classifier_2]
-                              ['accuracy'], dtype=np.float64)
-            # calculate the p_value
-            p_value = wilcoxon(perf_1, perf_2, zero_method='pratt')[1]
-            # appen to the list
-            p_values.append((classifier_1, classifier_2, p_value, False))
-    # get the number of hypothesis
-    k = len(p_values)
+    # the p-values calculated by the Wilcoxon signed rank test and the holm's correction of alpha
+    p_values = [(c1, c2, p, bool(r) and friedman_reject)
+                for c1, c2, p, r in stats['pairs'][['model_1', 'model_2', 'p_value', 'reject']].values]
     # sort the list in acsending manner of p-value
     p_values.sort(key=operator.itemgetter(2))
 
-    # loop through the hypothesis
-    for i in range(k):
-        # correct alpha with holm
-        new_alpha = float(alpha / (k - i))
-        # test if significant after holm's correction of alpha
-        if p_values[i][2] <= new_alpha:
-            p_values[i] = (p_values[i][0], p_values[i][1], p_values[i][2], True)
-        else:
-            # stop
-            break
     # compute the average ranks to be returned (useful for drawing the cd diagram)
-    # sort the dataframe of performances
-    sorted_df_perf = df_perf.loc[df_perf['classifier_name'].isin(classifiers)]. \
-        sort_values(['classifier_name', 'dataset_name'])
-    # get the rank data
-    rank_data = np.array(sorted_df_perf['accuracy']).reshape(m, max_nb_datasets)
-
     # create the data frame containg the accuracies
-    df_ranks = pd.DataFrame(data=rank_data, index=np.sort(classifiers), columns=
-    np.unique(sorted_df_perf['dataset_name']))
+    df_ranks = result_stats.pivot(df_perf).T
 
     # number of wins
     dfff = df_ranks.rank(ascending=False)
@@ -16,7 +16,7 @@ class RunPipeline():
     def __init__(self, suffix:str=None, mode:str='rla', parallel:str=None,
                  generate_duplicates=True, n_samples_threshold=1000,
                  realistic_synthetic_mode:str=None,
-                 noise_type=None):
+                 noise_type=None, reduction:str=None, n_components:int=50):
         '''
         :param suffix: saved file suffix (including the model performance result and model weights)
         :param mode: rla or nla —— ratio of labeled anomalies or number of labeled anomalies
@@ -25,6 +25,8 @@ class RunPipeline():
         :param n_samples_threshold: threshold for generating the above duplicates, if generate_duplicates is False, then datasets with sample size smaller than n_samples_threshold will be dropped
         :param realistic_synthetic_mode: local, global, dependency or cluster —— whether to generate the realistic synthetic anomalies to test different algorithms
         :param noise_type: duplicated_anomalies, irrelevant_features or label_contamination —— whether to test the model robustness
+        :param reduction: srp, pca or hashing —— whether to reduce the dimension of the wide datasets before fitting the models
+        :param n_components: the number of features after the dimensionality reduction
         '''
 
         # utils function
@@ -39,10 +41,14 @@ class RunPipeline():
 
         self.realistic_synthetic_mode = realistic_synthetic_mode
         self.noise_type = noise_type
+        self.reduction = reduction
+        self.n_components = n_components
 
         # the suffix of all saved files
         self.suffix = suffix + '_' + 'type(' + str(realistic_synthetic_mode) + ')_' + 'noise(' + str(noise_type) + ')_'\
                       + self.parallel
+        if self.reduction is not None:
+            self.suffix += '_' + 'reduction(' + self.reduction + '_' + str(self.n_components) + ')'
 
         # data generator instantiation
         self.data_generator = DataGenerator(generate_duplicates=self.generate_duplicates,
@@ -239,6 +245,8 @@ class RunPipeline():
         df_AUCPR = pd.DataFrame(data=None, index=experiment_params, columns=columns)
         df_time_fit = pd.DataFrame(data=None, index=experiment_params, columns=columns)
         df_time_inference = pd.DataFrame(data=None, index=experiment_params, columns=columns)
+        # the dimensionality reduction is timed separately from the fitting (only saved if the reduction is used)
+        df_time_reduction = pd.DataFrame(data=None, index=experiment_params, columns=columns)
 
         results = []
         for i, params in tqdm(enumerate(experiment_params)):
@@ -258,18 +266,22 @@ class RunPipeline():
                 if self.noise_type == 'duplicated_anomalies':
                     self.data = self.data_generator.generator(la=la, at_least_one_labeled=True, X=X, y=y,
                                                               realistic_synthetic_mode=self.realistic_synthetic_mode,
+                                                              reduction=self.reduction, n_components=self.n_components,
                                                               noise_type=self.noise_type, duplicate_times=noise_param)
                 elif self.noise_type == 'irrelevant_features':
                     self.data = self.data_generator.generator(la=la, at_least_one_labeled=True, X=X, y=y,
                                                               realistic_synthetic_mode=self.realistic_synthetic_mode,
+                                                              reduction=self.reduction, n_components=self.n_components,
                                                               noise_type=self.noise_type, noise_ratio=noise_param)
                 elif self.noise_type == 'label_contamination':
                     self.data = self.data_generator.generator(la=la, at_least_one_labeled=True, X=X, y=y,
                                                               realistic_synthetic_mode=self.realistic_synthetic_mode,
+                                                              reduction=self.reduction, n_components=self.n_components,
                                                               noise_type=self.noise_type, noise_ratio=noise_param)
                 else:
                     self.data = self.data_generator.generator(la=la, at_least_one_labeled=True, X=X, y=y,
-                                                              realistic_synthetic_mode=self.realistic_synthetic_mode)
+                                                              realistic_synthetic_mode=self.realistic_synthetic_mode,
+                                                              reduction=self.reduction, n_components=self.n_components)
 
             except Exception as error:
                 print(f'Error when generating data: {error}')
@@ -287,11 +299,12 @@ class RunPipeline():
                     print(f'Current experiment parameters: {params}, model: {model_name}, metrics: {metrics}, '
                           f'fitting time: {time_fit}, inference time: {time_inference}')
 
-                    # store and save the result (AUC-ROC, AUC-PR and runtime / inference time)
-                    df_AUCROC[model_name].iloc[i] = metrics['aucroc']
-                    df_AUCPR[model_name].iloc[i] = metrics['aucpr']
-                    df_time_fit[model_name].iloc[i] = time_fit
-                    df_time_inference[model_name].iloc[i] = time_inference
+                    # store and save the result (AUC-ROC, AUC-PR and runtime / inference time / reduction time)
+                    df_AUCROC.iloc[i, df_AUCROC.columns.get_loc(model_name)] = metrics['aucroc']
+                    df_AUCPR.iloc[i, df_AUCPR.columns.get_loc(model_name)] = metrics['aucpr']
+                    df_time_fit.iloc[i, df_time_fit.columns.get_loc(model_name)] = time_fit
+                    df_time_inference.iloc[i, df_time_inference.columns.get_loc(model_name)] = time_inference
+                    df_time_reduction.iloc[i, df_time_reduction.columns.get_loc(model_name)] = self.data_generator.time_reduction
 
                     df_AUCROC.to_csv(os.path.join(os.path.dirname(os.path.abspath(__file__)),
                                                   'result', 'AUCROC_' + self.suffix + '.csv'), index=True)
@@ -301,6 +314,9 @@ class RunPipeline():
                                                     'result', 'Time(fit)_' + self.suffix + '.csv'), index=True)
                     df_time_inference.to_csv(os.path.join(os.path.dirname(os.path.abspath(__file__)),
                                                           'result', 'Time(inference)_' + self.suffix + '.csv'), index=True)
+                    if self.reduction is not None:
+                        df_time_reduction.to_csv(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                              'result', 'Time(reduction)_' + self.suffix + '.csv'), index=True)
 
             else:
                 self.clf = clf; self.model_name = 'Customized'
@@ -310,11 +326,12 @@ class RunPipeline():
                 print(f'Current experiment parameters: {params}, model: {self.model_name}, metrics: {metrics}, '
                       f'fitting time: {time_fit}, inference time: {time_inference}')
 
-                # store and save the result (AUC-ROC, AUC-PR and runtime / inference time)
-                df_AUCROC[self.model_name].iloc[i] = metrics['aucroc']
-                df_AUCPR[self.model_name].iloc[i] = metrics['aucpr']
-                df_time_fit[self.model_name].iloc[i] = time_fit
-                df_time_inference[self.model_name].iloc[i] = time_inference
+                # store and save the result (AUC-ROC, AUC-PR and runtime / inference time / reduction time)
+                df_AUCROC.iloc[i, df_AUCROC.columns.get_loc(self.model_name)] = metrics['aucroc']
+                df_AUCPR.iloc[i, df_AUCPR.columns.get_loc(self.model_name)] = metrics['aucpr']
+                df_time_fit.iloc[i, df_time_fit.columns.get_loc(self.model_name)] = time_fit
+                df_time_inference.iloc[i, df_time_inference.columns.get_loc(self.model_name)] = time_inference
+                df_time_reduction.iloc[i, df_time_reduction.columns.get_loc(self.model_name)] = self.data_generator.time_reduction
 
                 df_AUCROC.to_csv(os.path.join(os.path.dirname(os.path.abspath(__file__)),
                                               'result', 'AUCROC_' + self.suffix + '.csv'), index=True)
@@ -324,5 +341,8 @@ class RunPipeline():
                                                 'result', 'Time(fit)_' + self.suffix + '.csv'), index=True)
                 df_time_inference.to_csv(os.path.join(os.path.dirname(os.path.abspath(__file__)),
                                                       'result', 'Time(inference)_' + self.suffix + '.csv'), index=True)
+                if self.reduction is not None:
+                    df_time_reduction.to_csv(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                          'result', 'Time(reduction)_' + self.suffix + '.csv'), index=True)
 
         return results
\ No newline at end of file
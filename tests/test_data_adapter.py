@@ -0,0 +1,29 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from adbench.datasets.data_adapter import DataAdapter
+
+
+def test_ingest_npz_keeps_float32(tmp_path):
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(200, 16)).astype(np.float32)
+    y = (rng.uniform(size=200) < 0.1).astype(np.int64)
+    path = str(tmp_path / 'embedding.npz')
+    np.savez_compressed(path, X=X, y=y)
+
+    adapter = DataAdapter(cache_dir=str(tmp_path / 'Cache'))
+    name = adapter.ingest_npz(path)
+    data = adapter.load(name)
+    assert data['X'].dtype == np.float32
+    np.testing.assert_array_equal(data['X'], X)
+
+    # a cache converted to float64 before is converted again
+    adapter_float64 = DataAdapter(cache_dir=str(tmp_path / 'Cache'), dtype=np.float64)
+    adapter_float64.ingest_npz(path, overwrite=True)
+    assert adapter.load(name)['X'].dtype == np.float64
+    adapter.ingest_npz(path)
+    assert adapter.load(name)['X'].dtype == np.float32
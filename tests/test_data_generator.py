@@ -0,0 +1,36 @@
+import os
+import sys
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.preprocessing import MaxAbsScaler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from adbench.datasets.data_generator import DataGenerator
+
+
+def sparse_dataset():
+    X = sp.random(2000, 300, density=0.02, format='csr', random_state=0) * 5
+    X = X.tolil()
+    X[:, 1] = -X[:, 1]  # a non-positive column
+    X[:, 2] = 0  # an all-zero column
+    y = np.zeros(2000)
+    y[:100] = 1
+    return X.tocsr(), y
+
+
+def test_sparse_input_with_default_scaling():
+    X, y = sparse_dataset()
+    data = DataGenerator(seed=1).generator(X=X, y=y, la=0.1)
+    unscaled = DataGenerator(seed=1).generator(X=X, y=y, la=0.1, minmax=False)
+
+    for split in ['X_train', 'X_test']:
+        assert sp.isspmatrix_csr(data[split])
+    np.testing.assert_array_equal(data['y_train'], unscaled['y_train'])
+
+    # the same as MaxAbsScaler (fitted on the training set) on the dense data
+    scaler = MaxAbsScaler().fit(unscaled['X_train'].toarray())
+    for split in ['X_train', 'X_test']:
+        np.testing.assert_allclose(data[split].toarray(), scaler.transform(unscaled[split].toarray()), rtol=1e-12)
+    assert np.abs(data['X_train']).max() <= 1.0
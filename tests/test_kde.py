@@ -0,0 +1,50 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+from scipy.spatial.distance import cdist
+from scipy.special import logsumexp
+from sklearn.model_selection import KFold
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# the DeepSAD baselines use script-relative imports (e.g., from base...)
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'adbench', 'baseline', 'semisupervised', 'DeepSAD', 'src')]
+
+from baselines.kde import KDE
+
+
+def brute_force_log_likelihood(X, bandwidths, cv=5):
+    # mean held-out log-likelihood of the gaussian kernel density over the folds, from the dense distances
+    n, d = X.shape
+    scores = np.zeros(len(bandwidths))
+    for train_idx, test_idx in KFold(n_splits=cv).split(X):
+        D = cdist(X[test_idx], X[train_idx], 'sqeuclidean')
+        for b, h in enumerate(bandwidths):
+            log_density = logsumexp(-D / (2 * h ** 2), axis=1) - np.log(len(train_idx)) - 0.5 * d * np.log(2 * np.pi * h ** 2)
+            scores[b] += log_density.sum() / cv
+    return scores
+
+
+@pytest.mark.parametrize('bandwidths', [
+    np.logspace(0.5, 5, num=10, base=2),  # the default grid, the kernels are derived by squaring
+    np.logspace(-4, 5, num=19, base=2),  # squaring down to tiny bandwidths (deep underflow without the shift)
+    np.array([0.3, 7.0, 1.1, 2.5, 0.05]),  # unordered, no power-of-2 ratios (exp for each bandwidth)
+])
+@pytest.mark.parametrize('d', [6, 50])
+def test_cv_log_likelihood_matches_brute_force(bandwidths, d):
+    rng = np.random.default_rng(d)
+    X = rng.normal(size=(1500, d)) * rng.uniform(0.05, 4, size=d)
+
+    # working_memory=1 (MB) splits each held-out fold into several distance blocks
+    scores = KDE(n_jobs=1).cv_log_likelihood(X, bandwidths, working_memory=1)
+    reference = brute_force_log_likelihood(X, bandwidths)
+    np.testing.assert_allclose(scores, reference, rtol=1e-10)
+    assert np.argmax(scores) == np.argmax(reference)
+
+
+def test_cv_log_likelihood_n_jobs():
+    X = np.random.default_rng(0).normal(size=(500, 4))
+    bandwidths = np.logspace(0.5, 5, num=10, base=2)
+    np.testing.assert_array_equal(KDE(n_jobs=1).cv_log_likelihood(X, bandwidths),
+                                  KDE(n_jobs=2).cv_log_likelihood(X, bandwidths))
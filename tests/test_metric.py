@@ -0,0 +1,71 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+from sklearn.metrics import roc_auc_score, average_precision_score
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from adbench.other_utils.metric import MetricEngine
+
+
+@pytest.mark.parametrize('ties', [False, True])
+def test_metric_matches_sklearn(ties):
+    rng = np.random.default_rng(0)
+    y_true = (rng.uniform(size=500) < 0.1).astype(int)
+    y_score = rng.normal(size=(4, 500)) + y_true
+    if ties:
+        y_score = np.round(y_score, 1)
+    y_score[3] = 1.0  # a constant score, i.e., a single threshold
+
+    result = MetricEngine().metric(y_true, y_score)
+    for i in range(len(y_score)):
+        assert np.isclose(result['aucroc'][i], roc_auc_score(y_true, y_score[i]), rtol=0, atol=1e-12)
+        assert np.isclose(result['aucpr'][i], average_precision_score(y_true, y_score[i]), rtol=0, atol=1e-12)
+
+        # R-precision: the fraction of anomalies in the top (number of anomalies) scores
+        k = y_true.sum()
+        top = np.argsort(-y_score[i], kind='mergesort')[:k]
+        assert np.isclose(result['patk'][i], y_true[top].mean())
+
+
+def test_metric_non_finite_scores():
+    y_true = np.array([0, 1, 0, 1, 0])
+    y_score = np.array([[0.1, 0.9, 0.2, 0.8, 0.3], [0.1, np.nan, 0.2, 0.8, 0.3]])
+
+    result = MetricEngine().metric(y_true, y_score)
+    assert result['aucroc'][0] == 1.0
+    assert np.isnan(result['aucroc'][1]) and np.isnan(result['aucpr'][1])
+
+
+def test_bootstrap_interval():
+    rng = np.random.default_rng(1)
+    y_true = (rng.uniform(size=300) < 0.2).astype(int)
+    y_score = rng.normal(size=300) + y_true
+
+    engine = MetricEngine(n_bootstrap=200, seed=0)
+    ci = engine.bootstrap(y_true, y_score)
+    point = engine.metric(y_true, y_score)
+    for name in ['aucroc', 'aucpr']:
+        assert ci[name][0, 0] <= point[name][0] <= ci[name][0, 1]
+
+    # the weighted resample is the same as sklearn on the explicitly resampled data
+    weights = np.random.default_rng(0).multinomial(300, np.full(300, 1 / 300), size=200)
+    resamples = [np.repeat(np.arange(300), w) for w in weights]
+    aucroc = [roc_auc_score(y_true[index], y_score[index]) for index in resamples]
+    aucpr = [average_precision_score(y_true[index], y_score[index]) for index in resamples]
+    assert np.allclose(ci['aucroc'][0], np.percentile(aucroc, [2.5, 97.5]))
+    assert np.allclose(ci['aucpr'][0], np.percentile(aucpr, [2.5, 97.5]))
+
+
+def test_bootstrap_chunks():
+    # the weights are drawn chunk by chunk, which gives the same resamples as drawing them at once
+    rng = np.random.default_rng(2)
+    y_true = (rng.uniform(size=300) < 0.2).astype(int)
+    y_score = rng.normal(size=(3, 300)) + y_true
+
+    whole = MetricEngine(n_bootstrap=200, seed=0).bootstrap(y_true, y_score)
+    chunked = MetricEngine(n_bootstrap=200, seed=0, chunk_size=300 * 7).bootstrap(y_true, y_score)
+    for name in ['aucroc', 'aucpr']:
+        np.testing.assert_array_equal(whole[name], chunked[name])
@@ -0,0 +1,31 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from adbench.myutils import Utils
+
+
+@pytest.mark.parametrize('replace', [False, True])
+def test_balanced_batch_sampler(replace):
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(1000, 5))
+    y = (np.arange(1000) < 30).astype(int)
+    utils = Utils()
+
+    if replace:
+        X_resample, y_resample = utils.sampler_2(X, y, step=7, batch_size=64, seed=1)
+    else:
+        X_resample, y_resample = utils.sampler(X, y, batch_size=64, seed=1)
+    batches = list(utils.balanced_batch_sampler(X, y, batch_size=64, n_batches=7 if replace else None,
+                                                replace=replace, seed=1))
+
+    # the lazy batches are the same as the resampled epoch returned by sampler / sampler_2
+    assert len(batches) == (7 if replace else (970 - 64) // 32 + 1)
+    np.testing.assert_array_equal(np.concatenate([X_batch for X_batch, _ in batches]), X_resample)
+    np.testing.assert_array_equal(np.concatenate([y_batch for _, y_batch in batches]), y_resample)
+    for _, y_batch in batches:
+        assert y_batch.sum() == 32
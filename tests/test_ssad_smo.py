@@ -0,0 +1,72 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+from scipy.optimize import minimize
+from sklearn.metrics.pairwise import rbf_kernel
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# the DeepSAD baselines use script-relative imports (e.g., from base...)
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'adbench', 'baseline', 'semisupervised', 'DeepSAD', 'src')]
+
+from baselines.shallow_ssad import SMOSSAD
+
+
+def dual_objective(alphas, cy, kernel):
+    ay = alphas.ravel() * cy.ravel()
+    return 0.5 * ay @ kernel @ ay
+
+
+def reference_alphas(ssad, kernel):
+    """The same SSAD dual problem solved by SLSQP on the dense kernel."""
+    Q = kernel * (ssad.cy @ ssad.cy.T)
+    constraints = [{'type': 'eq', 'fun': lambda a: ssad.cy.ravel() @ a - 1.0, 'jac': lambda a: ssad.cy.ravel()}]
+    if ssad.labeled > 0:
+        constraints.append({'type': 'ineq', 'fun': lambda a: ssad.cl @ a - ssad.kappa, 'jac': lambda a: ssad.cl})
+    x0 = np.full(ssad.samples, 1.0 / ssad.samples)
+    res = minimize(lambda a: 0.5 * a @ Q @ a, x0, jac=lambda a: Q @ a, method='SLSQP',
+                   bounds=list(zip(np.zeros(ssad.samples), ssad.cC)), constraints=constraints,
+                   options={'ftol': 1e-15, 'maxiter': 1000})
+    assert res.success, res.message
+    return res.x
+
+
+@pytest.mark.parametrize('n_pos, n_neg, kappa, C, gamma', [
+    (0, 0, 1.0, 1.0, 0.5),   # unlabeled only (kappa is set to 0)
+    (4, 4, 1.0, 1.0, 0.5),   # labeled normal and anomalous examples
+    (6, 0, 0.5, 0.2, 1.0),   # labeled normal examples only, active box constraints
+    (0, 5, 0.3, 0.5, 2.0),   # labeled anomalies only
+])
+def test_smo_matches_dense_qp(n_pos, n_neg, kappa, C, gamma):
+    rng = np.random.RandomState(0)
+    n = 40
+    X = rng.randn(n, 3)
+    y = np.zeros(n)
+    y[:n_pos] = 1
+    y[n_pos:n_pos + n_neg] = -1
+    X[y == -1] += 2.5
+
+    kernel_fn = lambda A, B: rbf_kernel(A, B, gamma=gamma)
+    ssad = SMOSSAD(X, y, kernel_fn, kappa=kappa, Cp=C, Cu=C, Cn=C, tol=1e-10)
+    ssad.fit()
+
+    kernel = kernel_fn(X, X)
+    alphas = ssad.get_alphas().ravel()
+    # feasibility of the SMO solution
+    assert np.all(alphas >= -1e-12) and np.all(alphas <= ssad.cC + 1e-12)
+    assert np.isclose(ssad.cy.ravel() @ alphas, 1.0, atol=1e-10)
+    if ssad.labeled > 0:
+        assert ssad.cl @ alphas >= ssad.kappa - 1e-10
+
+    objective = dual_objective(alphas, ssad.cy, kernel)
+    reference = dual_objective(reference_alphas(ssad, kernel), ssad.cy, kernel)
+    assert objective <= reference + 1e-8 * max(abs(reference), 1.0)
+    assert np.isclose(objective, reference, rtol=1e-9, atol=1e-12)
+
+
+def test_smo_rejects_precomputed_kernel():
+    X = np.random.RandomState(0).randn(10, 2)
+    ssad = SMOSSAD(X, np.zeros(10), lambda A, B: rbf_kernel(A, B))
+    with pytest.raises(TypeError):
+        ssad.set_train_kernel(rbf_kernel(X))
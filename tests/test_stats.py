@@ -0,0 +1,121 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.stats import wilcoxon, friedmanchisquare, rankdata
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from adbench.other_utils.stats import ResultStats
+
+
+def differences(case, n, rng):
+    if case == 'no_ties':
+        return rng.normal(size=n) + 0.3
+    d = rng.integers(-3, 5, size=n).astype(np.float64)
+    if case == 'ties':
+        d[d == 0] = 1.0
+    return d
+
+
+# n <= 13 with ties / zeros is the exhaustive sign-flip test (kept small, since scipy enumerates 2**n patterns),
+# n <= 50 without ties is the exact distribution, and n > 50 is the normal approximation
+@pytest.mark.parametrize('case, n', [('no_ties', 6), ('no_ties', 20), ('no_ties', 45), ('no_ties', 60),
+                                     ('ties', 8), ('ties', 30), ('ties', 60),
+                                     ('zeros', 8), ('zeros', 30), ('zeros', 60)])
+@pytest.mark.parametrize('zero_method', ['wilcox', 'pratt'])
+@pytest.mark.parametrize('alternative', ['two-sided', 'greater', 'less'])
+def test_wilcoxon_matches_scipy(case, n, zero_method, alternative):
+    rng = np.random.default_rng(n)
+    D = np.stack([differences(case, n, rng) for _ in range(4)])
+
+    p, r_plus, _ = ResultStats().wilcoxon_pvalue(D, zero_method=zero_method, alternative=alternative)
+    for i in range(len(D)):
+        reference = wilcoxon(D[i], zero_method=zero_method, alternative=alternative)
+        assert np.isclose(p[i], reference.pvalue, rtol=1e-9, atol=1e-15)
+        if alternative != 'two-sided':
+            assert np.isclose(r_plus[i], reference.statistic)
+
+
+def test_pairwise_wilcoxon_matrix():
+    rng = np.random.default_rng(0)
+    A = rng.uniform(size=(25, 5))
+    A[:, 1] = A[:, 0] + rng.normal(scale=0.1, size=25)
+
+    p_matrix = ResultStats().wilcoxon(A, zero_method='pratt', alternative='greater')
+    for i in range(A.shape[1]):
+        assert np.isnan(p_matrix[i, i])
+        for j in range(A.shape[1]):
+            if i != j:
+                reference = wilcoxon(A[:, i], A[:, j], zero_method='pratt', alternative='greater').pvalue
+                assert np.isclose(p_matrix[i, j], reference, rtol=1e-9)
+
+
+@pytest.mark.parametrize('ties', [False, True])
+def test_friedman_and_ranks(ties):
+    rng = np.random.default_rng(1)
+    A = rng.uniform(size=(30, 6))
+    if ties:
+        A = np.round(A, 1)
+    stats = ResultStats()
+
+    chisq, p = stats.friedman(A)
+    reference = friedmanchisquare(*A.T)
+    assert np.isclose(chisq, reference.statistic, rtol=1e-12)
+    assert np.isclose(p, reference.pvalue, rtol=1e-9)
+
+    ranks = np.mean([rankdata(-row, method='average') for row in A], axis=0)
+    assert np.allclose(stats.average_rank(A), ranks)
+
+
+def test_holm():
+    rng = np.random.default_rng(2)
+    p_values = np.concatenate([rng.uniform(0, 0.01, size=5), rng.uniform(0, 1, size=10)])
+    alpha = 0.05
+
+    # step-down: reject while p_(i) <= alpha / (k - i), then stop
+    reject = np.zeros(len(p_values), dtype=bool)
+    for i, idx in enumerate(np.argsort(p_values, kind='mergesort')):
+        if p_values[idx] > alpha / (len(p_values) - i):
+            break
+        reject[idx] = True
+
+    assert np.array_equal(ResultStats().holm(p_values, alpha=alpha), reject)
+
+
+def test_compute_long_and_wide_results():
+    rng = np.random.default_rng(3)
+    wide = pd.DataFrame(rng.uniform(size=(12, 4)), index=[f'd{i}' for i in range(12)], columns=list('abcd'))
+    long = wide.stack().reset_index()
+    long.columns = ['dataset_name', 'classifier_name', 'accuracy']
+
+    stats = ResultStats()
+    from_wide, from_long = stats.compute(wide), stats.compute(long)
+    pd.testing.assert_series_equal(from_wide['average_rank'], from_long['average_rank'], check_names=False)
+    pd.testing.assert_frame_equal(from_wide['p_matrix'], from_long['p_matrix'], check_names=False)
+    assert np.isclose(from_wide['friedman_p_value'], friedmanchisquare(*wide.values.T).pvalue)
+
+
+def long_results(A, models):
+    return pd.DataFrame({'dataset_name': np.repeat([f'd{i}' for i in range(A.shape[0])], A.shape[1]),
+                         'classifier_name': np.tile(models, A.shape[0]),
+                         'accuracy': A.ravel()})
+
+
+def test_wilcoxon_holm_two_classifiers():
+    from adbench.other_utils.utils import wilcoxon_holm
+
+    # the friedman test needs 3 classifiers, the two classifiers are compared by the wilcoxon test directly
+    rng = np.random.default_rng(4)
+    a = rng.uniform(size=20)
+    p_values, average_ranks, n_datasets = wilcoxon_holm(df_perf=long_results(np.stack([a + 0.1, a], axis=1), ['a', 'b']))
+    assert n_datasets == 20 and len(p_values) == 1
+    _, _, p, reject = p_values[0]
+    assert np.isclose(p, wilcoxon(a + 0.1, a, zero_method='pratt').pvalue)
+    assert reject
+
+    p_values, _, _ = wilcoxon_holm(df_perf=long_results(np.stack([a + rng.normal(scale=0.1, size=20), a], axis=1), ['a', 'b']))
+    assert p_values[0][2] > 0.05 and not p_values[0][3]
+